@@ -0,0 +1,100 @@
+"""Recherche plein texte dans les contenus (actualités, mur, forum, événements).
+
+Chaque type de contenu s'appuie sur l'index texte de sa collection (voir
+db_indexes.py, langue française). Les requêtes `$text` des différents types
+partent en parallèle; les résultats sont fusionnés par score de pertinence
+et paginés, avec le nombre de résultats par type (facettes).
+
+Les index texte n'ont pas les mêmes poids selon la collection (titre x10
+pour les actualités, sujets et événements; contenu seul pour le mur et les
+messages du forum). Ces poids font partie de la pertinence: un titre exact
+doit passer devant un mot dans un message. Les scores bruts sont donc
+fusionnés tels quels, puis ramenés au meilleur score toutes collections
+confondues (échelle unique, meilleur résultat = 1).
+
+Un type dont la requête échoue (ex. index texte absent) est journalisé et
+renvoyé vide: les autres types restent cherchés.
+"""
+import asyncio
+import logging
+import re
+from typing import Dict, List, Optional
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# type -> (collection, champ titre, champ extrait, champs renvoyés)
+CONTENT_TYPES = {
+    "news": ("news", "title", "excerpt", ["title", "excerpt", "category", "image_url", "created_at"]),
+    "post": ("posts", None, "content", ["content", "author_name", "author_photo", "image_url", "created_at"]),
+    "topic": ("forum_topics", "title", "description", ["title", "description", "forum_id", "author_name", "created_at"]),
+    "forum_message": ("forum_messages", None, "content", ["content", "topic_id", "forum_id", "author_name", "created_at"]),
+    "event": ("events", "title", "description", ["title", "description", "start_date", "city", "image_url", "created_at"]),
+}
+MAX_SEARCH_WINDOW = 200
+SNIPPET_LENGTH = 200
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _snippet(text: Optional[str]) -> str:
+    text = _WHITESPACE.sub(" ", text or "").strip()
+    return text if len(text) <= SNIPPET_LENGTH else text[:SNIPPET_LENGTH].rsplit(" ", 1)[0] + "…"
+
+
+async def search_content(db, q: str, filters: Dict[str, dict], page: int = 1, limit: int = 20) -> dict:
+    """Ranked, paged results across content types.
+
+    `filters` maps each searched type to the visibility filter of the caller
+    (e.g. published news only); types absent from it are not searched.
+    """
+    window = min(page * limit, MAX_SEARCH_WINDOW)
+
+    async def search_type(content_type: str):
+        collection, title_field, snippet_field, fields = CONTENT_TYPES[content_type]
+        query = {"$text": {"$search": q}, **filters[content_type]}
+        projection = {"_id": 0, "id": 1, "score": {"$meta": "textScore"}, **{field: 1 for field in fields}}
+        try:
+            docs, total = await asyncio.gather(
+                db[collection].find(query, projection).sort([("score", {"$meta": "textScore"})]).limit(window).to_list(window),
+                db[collection].count_documents(query)
+            )
+        except OperationFailure as e:
+            logger.error(f"❌ Recherche {content_type} ({collection}): {e}")
+            return content_type, [], 0
+        results = [
+            {
+                "type": content_type,
+                "id": doc.get("id"),
+                "title": doc.get(title_field) if title_field else None,
+                "snippet": _snippet(doc.get(snippet_field)),
+                "score": doc.get("score", 0),
+                **{field: doc.get(field) for field in fields if field not in (title_field, snippet_field)},
+            }
+            for doc in docs
+        ]
+        return content_type, results, total
+
+    searched = await asyncio.gather(*(search_type(content_type) for content_type in filters))
+
+    merged: List[dict] = []
+    facets = {}
+    for content_type, results, total in searched:
+        facets[content_type] = total
+        merged.extend(results)
+    # Échelle commune à tous les types: meilleur résultat = 1
+    top_score = max((result["score"] for result in merged), default=0) or 1
+    for result in merged:
+        result["score"] = round(result["score"] / top_score, 4)
+    # Score décroissant, puis le plus récent d'abord à score égal
+    merged.sort(key=lambda result: result.get("created_at") or "", reverse=True)
+    merged.sort(key=lambda result: result["score"], reverse=True)
+
+    start = (page - 1) * limit
+    return {
+        "results": merged[start:start + limit],
+        "total": sum(facets.values()),
+        "facets": facets,
+        "page": page,
+        "limit": limit,
+    }
@@ -0,0 +1,108 @@
+"""Compteurs d'audience écrits en différé (vues, impressions, clics).
+
+Les routes de lecture publiques (news, sujets du forum, sponsors, liens
+d'affiliation) n'écrivent plus un `$inc` par requête: elles appellent
+`incr`, qui cumule en mémoire par (collection, id, champ). `flush` écrit le
+tout périodiquement avec un bulk_write non ordonné par collection.
+
+`incr_bucket` sert aux séries temporelles (ex. impressions par sponsor et
+par heure): le document est identifié par une clé composée et créé au
+premier incrément (upsert).
+
+En cas d'arrêt brutal, les incréments non écrits sont perdus: ces compteurs
+sont indicatifs.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# (collection, clé du document sous forme de paires triées, champ)
+CounterKey = Tuple[str, Tuple[Tuple[str, Any], ...], str]
+
+
+class CounterBuffer:
+    def __init__(self):
+        self._pending: Dict[CounterKey, int] = defaultdict(int)
+        self._upsert_collections: Set[str] = set()
+        self._oldest: Optional[float] = None
+        self.last_flush_at: Optional[datetime] = None
+        self.last_flush_lag: float = 0.0
+
+    def _add(self, collection: str, key: Tuple[Tuple[str, Any], ...], field: str, amount: int) -> None:
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._pending[(collection, key, field)] += amount
+
+    def incr(self, collection: str, doc_id: str, field: str, amount: int = 1) -> None:
+        """Increment a field of an existing document (never created here)"""
+        self._add(collection, (("id", doc_id),), field, amount)
+
+    def incr_bucket(self, collection: str, key: Dict[str, Any], field: str, amount: int = 1) -> None:
+        """Increment a counter document identified by `key`, created on first write"""
+        self._upsert_collections.add(collection)
+        self._add(collection, tuple(sorted(key.items())), field, amount)
+
+    def pending(self, collection: str, doc_id: str, field: str) -> int:
+        """Increments not yet written, to add to a value read from the database"""
+        return self._pending.get((collection, (("id", doc_id),), field), 0)
+
+    async def flush(self, db) -> int:
+        """Write pending increments, one unordered bulk_write per collection.
+
+        Returns the number of documents updated.
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, defaultdict(int)
+        oldest, self._oldest = self._oldest, None
+
+        by_document: Dict[str, Dict[tuple, Dict[str, int]]] = defaultdict(lambda: defaultdict(dict))
+        for (collection, key, field), amount in pending.items():
+            by_document[collection][key][field] = amount
+
+        written = 0
+        for collection, documents in by_document.items():
+            upsert = collection in self._upsert_collections
+            entries = list(documents.items())
+            operations = [UpdateOne(dict(key), {"$inc": fields}, upsert=upsert) for key, fields in entries]
+            try:
+                await db[collection].bulk_write(operations, ordered=False)
+                written += len(operations)
+                continue
+            except BulkWriteError as e:
+                # Non ordonné: seules les opérations listées ont échoué, les autres sont appliquées
+                failed = sorted({error["index"] for error in e.details.get("writeErrors", [])})
+                logger.error(f"❌ Écriture des compteurs {collection}: {len(failed)} échec(s) sur {len(operations)}")
+                written += len(operations) - len(failed)
+            except Exception as e:
+                # Issue inconnue (ex. connexion perdue): tout remettre en attente
+                logger.error(f"❌ Écriture des compteurs {collection}: {e}")
+                failed = range(len(entries))
+            # Remettre en attente pour le prochain passage
+            for index in failed:
+                key, fields = entries[index]
+                for field, amount in fields.items():
+                    self._add(collection, key, field, amount)
+            if failed and oldest is not None:
+                self._oldest = min(self._oldest, oldest)
+
+        if oldest is not None:
+            self.last_flush_lag = time.monotonic() - oldest
+        self.last_flush_at = datetime.now(timezone.utc)
+        return written
+
+    def stats(self) -> dict:
+        return {
+            "pending_counters": len(self._pending),
+            # Âge de l'incrément en attente le plus ancien (secondes)
+            "flush_lag_seconds": round(time.monotonic() - self._oldest, 3) if self._oldest is not None else 0.0,
+            "last_flush_lag_seconds": round(self.last_flush_lag, 3),
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+        }
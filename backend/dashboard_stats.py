@@ -0,0 +1,139 @@
+"""Statistiques du tableau de bord admin, pré-calculées.
+
+Une agrégation `$facet` sur les membres (totaux, actifs, nouveaux du mois,
+répartition par pays, inscriptions par mois, derniers inscrits) et une sur
+les abonnements (chiffre d'affaires) produisent un instantané stocké dans
+`stats_snapshots`. Une tâche de fond le rafraîchit; la route du tableau de
+bord ne fait qu'une lecture.
+
+Le rafraîchissement est incrémental pour la série mensuelle: les mois
+clos sont repris de l'instantané précédent, seul le mois courant (et les
+mois manquants) est recompté.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from query_batch import run_queries
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID = "dashboard"
+MEMBER_QUERY = {"role": "membre"}
+MONTHS_SHOWN = 12
+MONTH_LABELS = ["Jan", "Fév", "Mar", "Avr", "Mai", "Jun", "Jul", "Aoû", "Sep", "Oct", "Nov", "Déc"]
+RECENT_MEMBER_FIELDS = [
+    "id", "first_name", "last_name", "full_name", "email", "phone", "date_of_birth", "country", "city",
+    "technical_director_id", "photo_url", "belt_grade", "membership_status", "membership_type",
+    "membership_start_date", "membership_end_date", "sessions_attended", "created_at",
+]
+
+
+def _month_keys(now: datetime, count: int) -> List[str]:
+    """'YYYY-MM' keys of the last `count` months, oldest first"""
+    year, month = now.year, now.month
+    keys = []
+    for _ in range(count):
+        keys.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return keys[::-1]
+
+
+def _month_start(key: str) -> str:
+    return datetime(int(key[:4]), int(key[5:7]), 1, tzinfo=timezone.utc).isoformat()
+
+
+async def compute_dashboard_snapshot(db, previous: Optional[dict] = None, now: Optional[datetime] = None) -> dict:
+    """Compute the dashboard figures, reusing closed months of `previous`"""
+    now = now or datetime.now(timezone.utc)
+    months = _month_keys(now, MONTHS_SHOWN)
+    current_month = months[-1]
+    previous_month = months[-2]
+
+    # Mois déjà clos lors de l'instantané précédent: pas besoin de les recompter
+    closed_before = ((previous or {}).get("computed_at") or "")[:7]
+    known = {
+        entry["key"]: entry["count"]
+        for entry in (previous or {}).get("members_by_month", [])
+        if entry.get("key") in months and entry["key"] < closed_before
+    }
+    first_missing = next(key for key in months if key not in known)
+    since_recount = _month_start(first_missing)
+    since_current = _month_start(current_month)
+
+    results = await run_queries({
+        "members": lambda: db.users.aggregate([
+            {"$match": MEMBER_QUERY},
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                "active": [{"$match": {"membership_status": "Actif"}}, {"$count": "count"}],
+                "new_this_month": [{"$match": {"created_at": {"$gte": since_current}}}, {"$count": "count"}],
+                "by_country": [
+                    {"$group": {"_id": {"$ifNull": ["$country", "Unknown"]}, "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}}
+                ],
+                "by_month": [
+                    {"$match": {"created_at": {"$gte": since_recount}}},
+                    {"$group": {"_id": {"$substrBytes": ["$created_at", 0, 7]}, "count": {"$sum": 1}}}
+                ],
+                "recent": [
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": 5},
+                    {"$project": {"_id": 0, **{field: 1 for field in RECENT_MEMBER_FIELDS}}}
+                ],
+            }}
+        ]).to_list(1),
+        "revenue": lambda: db.subscriptions.aggregate([
+            {"$facet": {
+                "total": [{"$group": {"_id": None, "amount": {"$sum": "$amount"}}}],
+                "by_month": [
+                    {"$match": {"created_at": {"$gte": _month_start(previous_month)}}},
+                    {"$group": {"_id": {"$substrBytes": ["$created_at", 0, 7]}, "amount": {"$sum": "$amount"}}}
+                ],
+            }}
+        ]).to_list(1),
+    })
+    facets = results["members"][0] if results["members"] else {}
+    revenue_facets = results["revenue"][0] if results["revenue"] else {}
+
+    def first_count(name: str) -> int:
+        values = facets.get(name) or []
+        return values[0]["count"] if values else 0
+
+    recounted = {group["_id"]: group["count"] for group in facets.get("by_month", [])}
+    revenue_by_month = {group["_id"]: group["amount"] for group in revenue_facets.get("by_month", [])}
+    this_month_revenue = revenue_by_month.get(current_month, 0)
+    last_month_revenue = revenue_by_month.get(previous_month, 0)
+    revenue_total = revenue_facets.get("total") or []
+
+    return {
+        "id": SNAPSHOT_ID,
+        "computed_at": now.isoformat(),
+        "total_members": first_count("total"),
+        "active_memberships": first_count("active"),
+        "new_members_this_month": first_count("new_this_month"),
+        "total_revenue": revenue_total[0]["amount"] if revenue_total else 0,
+        "revenue_change_percent": round(
+            (this_month_revenue - last_month_revenue) / last_month_revenue * 100, 1
+        ) if last_month_revenue else 0.0,
+        "members_by_month": [
+            {
+                "key": key,
+                "month": MONTH_LABELS[int(key[5:7]) - 1],
+                "count": known[key] if key in known else recounted.get(key, 0),
+            }
+            for key in months
+        ],
+        "members_by_country": [
+            {"country": group["_id"], "count": group["count"]} for group in facets.get("by_country", [])
+        ],
+        "recent_members": facets.get("recent", []),
+    }
+
+
+async def refresh_dashboard_snapshot(db) -> dict:
+    """Recompute the dashboard snapshot and store it in stats_snapshots"""
+    previous = await db.stats_snapshots.find_one({"id": SNAPSHOT_ID}, {"_id": 0})
+    snapshot = await compute_dashboard_snapshot(db, previous)
+    await db.stats_snapshots.replace_one({"id": SNAPSHOT_ID}, snapshot, upsert=True)
+    return snapshot
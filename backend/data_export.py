@@ -0,0 +1,118 @@
+"""Exports admin en flux (CSV ou NDJSON).
+
+Les lignes sont lues depuis un curseur Motor par lots et écrites dans la
+réponse au fur et à mesure: la mémoire utilisée ne dépend pas de la taille
+du jeu de données. Seules les colonnes déclarées ici peuvent être exportées
+(pas de password_hash ni de photo en base64).
+"""
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional
+
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+EXPORT_BATCH_SIZE = 500
+# Débuts de cellule interprétés comme une formule par les tableurs
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# jeu de données -> (collection, colonnes exportables, filtres acceptés)
+EXPORT_DATASETS = {
+    "members": (
+        "users",
+        ["id", "full_name", "email", "phone", "role", "date_of_birth", "country", "city", "club_id",
+         "technical_director_id", "belt_grade", "membership_status", "membership_type",
+         "membership_start_date", "membership_end_date", "has_paid_license", "is_premium", "created_at"],
+        ["role", "country", "city", "club_id", "membership_status", "belt_grade"],
+    ),
+    "orders": (
+        "orders",
+        ["id", "user_id", "user_email", "items", "subtotal", "discount_applied", "total_amount", "currency",
+         "status", "payment_status", "created_at", "updated_at"],
+        ["status", "payment_status", "user_id"],
+    ),
+    "leads": (
+        "leads",
+        ["id", "full_name", "email", "phone", "city", "country", "person_type", "motivations", "training_mode",
+         "nearest_club_city", "status", "notes", "created_at"],
+        ["status", "person_type", "country"],
+    ),
+    "token_ledger": (
+        "token_transactions",
+        ["id", "user_id", "amount", "action_type", "description", "reference_id", "context_type",
+         "context_name", "balance_after", "created_at"],
+        ["user_id", "action_type", "context_type"],
+    ),
+}
+
+
+def select_columns(dataset: str, columns: Optional[str]) -> List[str]:
+    """Columns to export, in the requested order; ValueError if one is not exportable"""
+    allowed = EXPORT_DATASETS[dataset][1]
+    if not columns:
+        return list(allowed)
+    selected = list(dict.fromkeys(column.strip() for column in columns.split(",") if column.strip()))
+    unknown = [column for column in selected if column not in allowed]
+    if unknown or not selected:
+        raise ValueError(f"Colonnes non exportables: {', '.join(unknown) or columns}")
+    return selected
+
+
+def build_export_query(dataset: str, params: Mapping[str, str],
+                       since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+    """Mongo filter from the dataset's accepted filter parameters and a created_at range"""
+    query: Dict[str, Any] = {field: params[field] for field in EXPORT_DATASETS[dataset][2] if params.get(field)}
+    if since or until:
+        query["created_at"] = {}
+        if since:
+            query["created_at"]["$gte"] = since
+        if until:
+            query["created_at"]["$lt"] = until
+    return query
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        value = "; ".join(value)
+    elif isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False, default=str)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Texte saisi par les utilisateurs (ex. formulaire public des leads):
+        # neutraliser les formules à l'ouverture dans Excel
+        return "'" + value
+    return value
+
+
+async def stream_export(db, dataset: str, query: Dict[str, Any], columns: List[str],
+                        export_format: str) -> AsyncIterator[str]:
+    """Yield the export in chunks of EXPORT_BATCH_SIZE rows, newest first.
+
+    Every dataset has a created_at index, so the sort never happens in memory.
+    """
+    collection = EXPORT_DATASETS[dataset][0]
+    projection = {"_id": 0, **{column: 1 for column in columns}}
+    cursor = db[collection].find(query, projection).sort("created_at", -1).batch_size(EXPORT_BATCH_SIZE)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer:
+        # BOM: Excel ouvre alors le fichier en UTF-8 (accents)
+        buffer.write("\ufeff")
+        writer.writerow(columns)
+
+    rows = 0
+    async for doc in cursor:
+        if writer:
+            writer.writerow([_csv_value(doc.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps({column: doc.get(column) for column in columns}, ensure_ascii=False, default=str))
+            buffer.write("\n")
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
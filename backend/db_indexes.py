@@ -0,0 +1,339 @@
+"""Registre des index MongoDB de l'application.
+
+Chaque collection interrogée par server.py déclare ici les index dont elle a
+besoin. `ensure_indexes` crée les index manquants (opération idempotente) et
+`check_indexes` compare ce qui existe en base avec ce qui est déclaré.
+
+Utilisation en déploiement:
+    python db_indexes.py            # crée les index manquants
+    python db_indexes.py --check    # affiche la dérive sans rien modifier
+"""
+import asyncio
+import logging
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def _index(*keys: Tuple[str, int], unique: bool = False, **options) -> IndexModel:
+    """Build an IndexModel with a stable, readable name derived from its keys"""
+    name = "_".join(f"{field}_{direction}" for field, direction in keys)
+    if unique:
+        options["unique"] = True
+    return IndexModel(list(keys), name=name, **options)
+
+
+def _text_index(**weights: int) -> IndexModel:
+    """Full-text index (one per collection) over the given fields and weights"""
+    name = "text_" + "_".join(weights)
+    return IndexModel([(field, TEXT) for field in weights], name=name, weights=weights,
+                      default_language="french")
+
+
+# Index déclarés par collection
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "users": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("email", ASCENDING), unique=True),
+        _index(("role", ASCENDING), ("created_at", DESCENDING)),
+        _index(("club_id", ASCENDING)),
+        _index(("country", ASCENDING)),
+        _index(("created_at", DESCENDING)),
+        # Tris de la grille admin /admin/users (départagés par id)
+        _index(("created_at", DESCENDING), ("id", DESCENDING)),
+        _index(("full_name", ASCENDING), ("id", ASCENDING)),
+        _index(("email", ASCENDING), ("id", ASCENDING)),
+    ],
+    "members": [
+        _index(("id", ASCENDING)),
+        _index(("email", ASCENDING)),
+    ],
+    "technical_directors": [
+        _index(("id", ASCENDING)),
+        _index(("email", ASCENDING)),
+    ],
+    "pending_members": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("email", ASCENDING), ("status", ASCENDING)),
+        _index(("status", ASCENDING), ("created_at", DESCENDING)),
+    ],
+    "subscriptions": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("member_id", ASCENDING)),
+    ],
+    "leads": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("status", ASCENDING), ("created_at", DESCENDING)),
+        # Export admin trié par date (data_export.py)
+        _index(("created_at", DESCENDING)),
+    ],
+    "tasks": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("created_at", DESCENDING)),
+    ],
+    "news": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("status", ASCENDING), ("created_at", DESCENDING)),
+        _index(("created_at", DESCENDING)),
+        _text_index(title=10, excerpt=5, content=1),
+    ],
+    "news_comments": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("news_id", ASCENDING), ("created_at", ASCENDING)),
+    ],
+    "news_reactions": [
+        _index(("news_id", ASCENDING), ("user_id", ASCENDING), unique=True),
+    ],
+    "events": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("start_date", ASCENDING)),
+        _text_index(title=10, description=2, city=1),
+    ],
+    "event_registrations": [
+        _index(("event_id", ASCENDING), ("member_id", ASCENDING), unique=True),
+        _index(("member_id", ASCENDING)),
+    ],
+    "conversations": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("participants", ASCENDING), ("updated_at", DESCENDING)),
+    ],
+    "messages": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("conversation_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)),
+        _index(("conversation_id", ASCENDING), ("read", ASCENDING), ("sender_id", ASCENDING)),
+        _index(("created_at", DESCENDING)),
+    ],
+    "unread_counters": [
+        _index(("user_id", ASCENDING), unique=True),
+    ],
+    "posts": [
+        _index(("id", ASCENDING), unique=True),
+        # Pagination par curseur du mur (created_at, id)
+        _index(("created_at", DESCENDING), ("id", DESCENDING)),
+        _text_index(content=1),
+    ],
+    "post_comments": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("post_id", ASCENDING), ("created_at", ASCENDING)),
+    ],
+    "post_reactions": [
+        _index(("post_id", ASCENDING), ("user_id", ASCENDING), unique=True),
+    ],
+    "user_activity": [
+        _index(("user_id", ASCENDING), unique=True),
+        _index(("last_active", DESCENDING)),
+    ],
+    "forums": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("created_at", DESCENDING)),
+    ],
+    "forum_topics": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("forum_id", ASCENDING), ("is_pinned", DESCENDING), ("created_at", DESCENDING)),
+        _text_index(title=10, description=2),
+    ],
+    "forum_messages": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("topic_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)),
+        _index(("forum_id", ASCENDING)),
+        # Couvre l'agrégation des auteurs actifs de /forums/stats
+        _index(("created_at", DESCENDING), ("author_id", ASCENDING)),
+        _text_index(content=1),
+    ],
+    "campaigns": [
+        _index(("id", ASCENDING), unique=True),
+    ],
+    "affiliates": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("code", ASCENDING)),
+    ],
+    "products": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("is_active", ASCENDING), ("created_at", DESCENDING)),
+    ],
+    "orders": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("user_id", ASCENDING), ("created_at", DESCENDING)),
+        _index(("status", ASCENDING), ("created_at", DESCENDING)),
+        # Export admin trié par date (data_export.py)
+        _index(("created_at", DESCENDING)),
+    ],
+    "payment_transactions": [
+        _index(("session_id", ASCENDING)),
+    ],
+    "invoices": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("user_id", ASCENDING), ("created_at", DESCENDING)),
+    ],
+    "chat_history": [
+        _index(("user_id", ASCENDING), ("created_at", DESCENDING)),
+    ],
+    "settings": [
+        _index(("id", ASCENDING), unique=True),
+    ],
+    "images": [
+        _index(("id", ASCENDING), unique=True),
+    ],
+    "clubs": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("name", ASCENDING)),
+    ],
+    "visit_requests": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("target_club_id", ASCENDING), ("status", ASCENDING)),
+        _index(("home_club_id", ASCENDING)),
+        _index(("member_id", ASCENDING)),
+    ],
+    "token_balances": [
+        _index(("user_id", ASCENDING), unique=True),
+        _index(("total_earned", DESCENDING)),
+    ],
+    "token_transactions": [
+        _index(("user_id", ASCENDING), ("created_at", DESCENDING)),
+        _index(("user_id", ASCENDING), ("action_type", ASCENDING), ("created_at", DESCENDING)),
+        _index(("created_at", DESCENDING)),
+    ],
+    "badges": [
+        _index(("id", ASCENDING), unique=True),
+    ],
+    "user_badges": [
+        _index(("user_id", ASCENDING)),
+    ],
+    "sponsors": [
+        _index(("id", ASCENDING), unique=True),
+        _index(("active", ASCENDING)),
+    ],
+    "stats_snapshots": [
+        _index(("id", ASCENDING), unique=True),
+    ],
+    "sponsor_stats_hourly": [
+        _index(("sponsor_id", ASCENDING), ("hour", ASCENDING), unique=True),
+        _index(("day", ASCENDING)),
+    ],
+}
+
+
+def _declared_spec(model: IndexModel) -> dict:
+    """Comparable view of a declared index (keys + unique flag)"""
+    document = model.document
+    key = list(document["key"].items())
+    if any(direction == TEXT for _, direction in key):
+        # Mongo expose les index texte sous cette forme dans index_information()
+        key = [("_fts", TEXT), ("_ftsx", 1)]
+    return {
+        "name": document["name"],
+        "key": key,
+        "unique": bool(document.get("unique", False)),
+    }
+
+
+def _existing_spec(info: dict) -> dict:
+    """Comparable view of an index as returned by index_information()"""
+    return {
+        "key": [(field, direction) for field, direction in info["key"]],
+        "unique": bool(info.get("unique", False)),
+    }
+
+
+async def check_indexes(db) -> Dict[str, dict]:
+    """Compare declared indexes with the ones present in the database.
+
+    Returns, for every collection with drift, the declared indexes that are
+    missing, the ones whose options differ and the undeclared extras.
+    """
+    report = {}
+    for collection_name, models in INDEX_REGISTRY.items():
+        existing = await db[collection_name].index_information()
+        existing_by_key = {
+            tuple(_existing_spec(info)["key"]): (name, _existing_spec(info))
+            for name, info in existing.items()
+        }
+
+        missing, mismatched, declared_keys = [], [], set()
+        for model in models:
+            spec = _declared_spec(model)
+            key = tuple(spec["key"])
+            declared_keys.add(key)
+            if key not in existing_by_key:
+                missing.append(spec["name"])
+            elif existing_by_key[key][1]["unique"] != spec["unique"]:
+                mismatched.append(existing_by_key[key][0])
+
+        extra = [
+            name for key, (name, _) in existing_by_key.items()
+            if name != "_id_" and key not in declared_keys
+        ]
+
+        if missing or mismatched or extra:
+            report[collection_name] = {"missing": missing, "mismatched": mismatched, "extra": extra}
+    return report
+
+
+async def ensure_indexes(db) -> Dict[str, dict]:
+    """Create every declared index that does not exist yet.
+
+    Safe to call on each startup: existing indexes are left untouched. Each
+    index is created on its own, so a failure (e.g. duplicates preventing a
+    unique index) is logged and reported for that index only.
+    """
+    summary = {}
+    for collection_name, models in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        existing_keys = {
+            tuple(_existing_spec(info)["key"])
+            for info in (await collection.index_information()).values()
+        }
+        to_create = [m for m in models if tuple(_declared_spec(m)["key"]) not in existing_keys]
+        if not to_create:
+            continue
+        created, errors = [], {}
+        for model in to_create:
+            name = model.document["name"]
+            try:
+                created.extend(await collection.create_indexes([model]))
+            except OperationFailure as e:
+                errors[name] = str(e)
+                logger.error(f"❌ Création de l'index {collection_name}.{name} impossible: {e}")
+        summary[collection_name] = {"created": created}
+        if errors:
+            summary[collection_name]["errors"] = errors
+        if created:
+            logger.info(f"📇 Index créés sur {collection_name}: {', '.join(created)}")
+    return summary
+
+
+async def _main(argv: List[str]) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ.get("DB_NAME", "academie_levinet_db")]
+    try:
+        if "--check" in argv:
+            report = await check_indexes(db)
+            if not report:
+                print("[OK] Aucun écart entre les index déclarés et la base")
+                return 0
+            for collection_name, drift in report.items():
+                print(f"[!] {collection_name}: {drift}")
+            return 1
+
+        summary = await ensure_indexes(db)
+        if not summary:
+            print("[OK] Tous les index déclarés existent déjà")
+        for collection_name, result in summary.items():
+            print(f"  {collection_name}: {result}")
+        return 1 if any("errors" in r for r in summary.values()) else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -1,3 +1,4 @@
+import asyncio
 import aiosmtplib
 import os
 import resend
@@ -37,7 +38,8 @@ async def send_email(to_email: str, subject: str, html_content: str, text_conten
             if text_content:
                 params["text"] = text_content
             
-            response = resend.Emails.send(params)
+            # Le SDK Resend est synchrone: ne pas bloquer la boucle d'événements
+            response = await asyncio.to_thread(resend.Emails.send, params)
             logger.info(f"Email sent via Resend to {to_email}: {response}")
             return True
         except Exception as e:
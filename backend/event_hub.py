@@ -0,0 +1,121 @@
+"""Diffusion d'événements temps réel vers les clients connectés (SSE).
+
+`EventHub` garde, pour chaque utilisateur, les files des connexions ouvertes
+sur ce worker et y publie les événements (nouveau message, compteur de non
+lus...). Une file pleine signale un client trop lent: elle est vidée et
+remplacée par un événement `resync` qui demande au client de recharger.
+
+`MongoEventRelay` (optionnel) partage les événements entre plusieurs
+workers via une collection plafonnée lue avec un curseur tailable.
+"""
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+
+class EventHub:
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.relay: Optional["MongoEventRelay"] = None
+        self.dropped = 0
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def is_connected(self, user_id: str) -> bool:
+        """Whether the user has an open connection on this worker"""
+        return bool(self._subscribers.get(user_id))
+
+    def has_listeners(self, user_id: str) -> bool:
+        """Whether an event for this user may reach someone (here or via the relay)"""
+        return self.relay is not None or self.is_connected(user_id)
+
+    def deliver(self, user_id: str, event: dict) -> None:
+        """Push an event to the local connections of a user"""
+        for queue in list(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Client trop lent: on abandonne son retard et il se resynchronise
+                self.dropped += queue.qsize()
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    async def publish(self, user_id: str, event_type: str, data: dict) -> None:
+        event = {"type": event_type, "data": data}
+        self.deliver(user_id, event)
+        if self.relay is not None:
+            try:
+                await self.relay.forward(user_id, event)
+            except Exception as e:
+                logger.error(f"❌ Relais d'événements: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "connected_users": len(self._subscribers),
+            "connections": sum(len(queues) for queues in self._subscribers.values()),
+            "dropped_events": self.dropped,
+            "relay": self.relay is not None,
+        }
+
+
+class MongoEventRelay:
+    """Share hub events between workers through a capped collection"""
+
+    def __init__(self, db, hub: EventHub, collection_name: str = "event_relay", size_bytes: int = 16 * 1024 * 1024):
+        self.db = db
+        self.hub = hub
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self.worker_id = str(uuid.uuid4())
+
+    async def setup(self) -> None:
+        try:
+            await self.db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass  # Déjà créée
+        self.hub.relay = self
+
+    async def forward(self, user_id: str, event: dict) -> None:
+        await self.db[self.collection_name].insert_one({
+            "worker_id": self.worker_id,
+            "user_id": user_id,
+            "event": event,
+            "created_at": datetime.now(timezone.utc)
+        })
+
+    async def run(self) -> None:
+        """Tail the relay collection and deliver events from other workers"""
+        collection = self.db[self.collection_name]
+        last = await collection.find_one({}, sort=[("$natural", -1)])
+        last_id = last["_id"] if last else None
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            while cursor.alive:
+                async for record in cursor:
+                    last_id = record["_id"]
+                    if record.get("worker_id") != self.worker_id:
+                        self.hub.deliver(record["user_id"], record["event"])
+            # Collection vide ou curseur invalidé: on réessaie un peu plus tard
+            await asyncio.sleep(1)
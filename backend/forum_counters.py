@@ -0,0 +1,92 @@
+"""Compteurs dénormalisés du forum.
+
+`forums.topic_count`, `forums.message_count` et `forum_topics.message_count`
+sont maintenus par des `$inc` atomiques dans les routes du forum
+(create_topic, create_message, delete_topic). `reconcile_forum_counters`
+les recalcule par agrégation et corrige ceux qui ont dérivé.
+
+Usage en ligne de commande (depuis backend/):
+    python forum_counters.py           # corriger
+    python forum_counters.py --check   # lister les écarts sans écrire
+"""
+import asyncio
+import logging
+import os
+import sys
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+async def _count_by(collection, field: str) -> Dict[str, int]:
+    groups = await collection.aggregate([
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    return {group["_id"]: group["count"] for group in groups if group["_id"] is not None}
+
+
+async def _fix(collection, fields_by_id: Dict[str, dict], projection: List[str], dry_run: bool) -> int:
+    operations = []
+    async for doc in collection.find({}, {"_id": 0, "id": 1, **{field: 1 for field in projection}}):
+        expected = {field: fields_by_id.get(field, {}).get(doc["id"], 0) for field in projection}
+        if any(doc.get(field) != value for field, value in expected.items()):
+            operations.append(UpdateOne({"id": doc["id"]}, {"$set": expected}))
+    if operations and not dry_run:
+        await collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def reconcile_forum_counters(db, dry_run: bool = False) -> Dict[str, int]:
+    """Recompute forum and topic counters with three $group aggregations.
+
+    Returns the number of forums and topics whose counters differed.
+    """
+    topics_by_forum, messages_by_forum, messages_by_topic = await asyncio.gather(
+        _count_by(db.forum_topics, "forum_id"),
+        _count_by(db.forum_messages, "forum_id"),
+        _count_by(db.forum_messages, "topic_id"),
+    )
+    fixed = {
+        "forums": await _fix(
+            db.forums,
+            {"topic_count": topics_by_forum, "message_count": messages_by_forum},
+            ["topic_count", "message_count"],
+            dry_run
+        ),
+        "topics": await _fix(
+            db.forum_topics,
+            {"message_count": messages_by_topic},
+            ["message_count"],
+            dry_run
+        ),
+    }
+    if not dry_run and any(fixed.values()):
+        logger.info(f"🔁 Compteurs du forum corrigés: {fixed}")
+    return fixed
+
+
+async def _main(argv: List[str]) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ.get("DB_NAME", "academie_levinet_db")]
+    try:
+        dry_run = "--check" in argv
+        fixed = await reconcile_forum_counters(db, dry_run=dry_run)
+        if not any(fixed.values()):
+            print("[OK] Compteurs du forum à jour")
+            return 0
+        action = "à corriger" if dry_run else "corrigés"
+        print(f"[!] {fixed['forums']} forums et {fixed['topics']} sujets {action}")
+        return 1 if dry_run else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
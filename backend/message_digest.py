@@ -0,0 +1,104 @@
+"""Notifications email des messages privés, regroupées par destinataire.
+
+send_message ne déclenche plus un email par message: `schedule` note le
+message et `flush` (tâche de fond) envoie un seul récapitulatif par
+destinataire une fois la fenêtre écoulée depuis son premier message en
+attente. Les destinataires en ligne, ou qui ont déjà lu les messages, ne
+reçoivent rien. Les destinataires sont résolus par le PersonResolver.
+"""
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from email_service import send_email, get_new_message_notification_html
+
+logger = logging.getLogger(__name__)
+
+
+class MessageDigestScheduler:
+    def __init__(self, resolver, window_seconds: float = 300, is_online: Optional[Callable[[str], bool]] = None):
+        self.resolver = resolver
+        self.window_seconds = window_seconds
+        self.is_online = is_online or (lambda user_id: False)
+        self._pending: Dict[str, dict] = {}
+        self.sent = 0
+        self.skipped = 0
+
+    def schedule(self, recipient_id: str, message_id: str, sender_name: str, content: str) -> None:
+        """Queue a message for the recipient's next digest"""
+        pending = self._pending.setdefault(recipient_id, {"since": time.monotonic(), "messages": []})
+        pending["messages"].append({"id": message_id, "sender_name": sender_name, "preview": content[:200]})
+
+    async def flush(self, db, force: bool = False) -> int:
+        """Send the digests whose window has elapsed (all of them if `force`).
+
+        Returns the number of emails sent.
+        """
+        now = time.monotonic()
+        due = [
+            recipient_id for recipient_id, pending in self._pending.items()
+            if force or now - pending["since"] >= self.window_seconds
+        ]
+        if not due:
+            return 0
+        batches = {recipient_id: self._pending.pop(recipient_id)["messages"] for recipient_id in due}
+
+        # Rien à envoyer aux utilisateurs connectés: ils voient déjà les messages
+        for recipient_id in [rid for rid in batches if self.is_online(rid)]:
+            self.skipped += len(batches.pop(recipient_id))
+        if not batches:
+            return 0
+
+        # Ne garder que les messages encore non lus
+        message_ids = [message["id"] for messages in batches.values() for message in messages]
+        unread_ids = {
+            message["id"] async for message in db.messages.find(
+                {"id": {"$in": message_ids}, "read": False}, {"_id": 0, "id": 1}
+            )
+        }
+        for recipient_id in list(batches):
+            messages = [message for message in batches[recipient_id] if message["id"] in unread_ids]
+            self.skipped += len(batches[recipient_id]) - len(messages)
+            if messages:
+                batches[recipient_id] = messages
+            else:
+                del batches[recipient_id]
+
+        recipients = await self.resolver.resolve_many(db, list(batches))
+        sent = 0
+        for recipient_id, messages in batches.items():
+            recipient = recipients.get(recipient_id)
+            if not recipient or not recipient.get("email"):
+                continue
+            if await self._send_digest(recipient, messages):
+                sent += 1
+        self.sent += sent
+        return sent
+
+    async def _send_digest(self, recipient: dict, messages: List[dict]) -> bool:
+        sender_names = list(dict.fromkeys(message["sender_name"] for message in messages))
+        senders = ", ".join(sender_names)
+        if len(messages) == 1:
+            subject = f"Nouveau message de {senders}"
+            preview = messages[0]["preview"]
+        else:
+            subject = f"{len(messages)} nouveaux messages de {senders}"
+            preview = "<br>".join(message["preview"] for message in messages[-5:])
+        return await send_email(
+            to_email=recipient["email"],
+            subject=subject,
+            html_content=get_new_message_notification_html(
+                recipient_name=recipient["name"],
+                sender_name=senders,
+                message_preview=preview
+            ),
+            text_content=f"{subject}: " + " / ".join(message["preview"] for message in messages[-5:])
+        )
+
+    def stats(self) -> dict:
+        return {
+            "pending_recipients": len(self._pending),
+            "pending_messages": sum(len(p["messages"]) for p in self._pending.values()),
+            "sent": self.sent,
+            "skipped_messages": self.skipped,
+        }
@@ -0,0 +1,48 @@
+"""Pagination par curseur (keyset) pour les listes triées.
+
+Un curseur encode les valeurs de tri du dernier élément d'une page, par
+exemple (created_at, id). La page suivante est lue avec une condition
+strictement après ce couple au lieu d'un `.skip()` qui parcourt toutes les
+entrées précédentes.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode an opaque cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_filter(sort_field: str, sort_value: Any, id_value: Any, descending: bool = True,
+                  id_field: str = "id") -> Dict[str, Any]:
+    """Mongo filter selecting documents after (sort_value, id_value) in sort order.
+
+    The sort must be on (sort_field, id_field) in the same direction.
+    """
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, id_field: {op: id_value}},
+    ]}
+
+
+def next_cursor(items: List[dict], limit: int, sort_field: str, id_field: str = "id") -> Optional[str]:
+    """Cursor pointing after the last item, or None when the page is the last one"""
+    if len(items) < limit or not items:
+        return None
+    last = items[-1]
+    return encode_cursor(last.get(sort_field), last.get(id_field))
@@ -0,0 +1,72 @@
+"""Hachage bcrypt hors de la boucle asyncio.
+
+bcrypt.hashpw/checkpw prennent ~250 ms de CPU et bloquent la boucle d'événements
+s'ils sont appelés directement dans une route async. Ils sont exécutés ici sur
+un pool de threads dédié (bcrypt libère le GIL), avec une limite de
+concurrence pour qu'un pic de connexions ne sature pas la machine.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+BCRYPT_MAX_WORKERS = int(os.environ.get('BCRYPT_MAX_WORKERS', '2'))
+
+
+class PasswordHasher:
+    """Runs bcrypt calls on a bounded executor and tracks its queue depth"""
+
+    def __init__(self, max_workers: int = BCRYPT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._semaphore = None
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Créé paresseusement pour être lié à la boucle d'uvicorn
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    async def _run(self, func, *args):
+        self._waiting += 1
+        acquired = False
+        try:
+            async with self._get_semaphore():
+                acquired = True
+                self._waiting -= 1
+                self._running += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self._executor, func, *args)
+                finally:
+                    self._running -= 1
+                    self._completed += 1
+        finally:
+            # Requête annulée pendant l'attente (client déconnecté)
+            if not acquired:
+                self._waiting -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
+        return hashed.decode('utf-8')
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "queue_depth": self._waiting,
+            "running": self._running,
+            "completed": self._completed,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
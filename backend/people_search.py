@@ -0,0 +1,209 @@
+"""Index de recherche des personnes en mémoire (saisie semi-automatique).
+
+Remplace les `$regex` non ancrées de /api/users/search sur trois
+collections. Les noms et emails sont normalisés (minuscules, sans accents)
+et découpés en mots; chaque mot est indexé par ses préfixes courts et ses
+trigrammes, ce qui permet de retrouver un préfixe comme une sous-chaîne
+sans parcourir les collections. Les libellés du domaine des emails sont
+indexés aussi ("orange", "fr"), et une requête contenant "@" ou "." est
+également cherchée telle quelle dans l'adresse complète.
+
+L'index est construit au démarrage puis tenu à jour: les écritures sur
+`users` marquent l'utilisateur à rafraîchir (voir invalidate_user_caches),
+et les entrées marquées sont relues au prochain appel de `refresh`.
+
+Chaque entrée ne garde que id, nom, email et type: la mémoire de l'index ne
+dépend pas des photos, qui sont lues pour les seuls résultats renvoyés
+(voir PersonResolver.with_photos).
+"""
+import asyncio
+import heapq
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from person_resolver import SOURCES, person_card
+
+logger = logging.getLogger(__name__)
+
+# Adresses système de l'académie, jamais proposées dans la recherche
+SYSTEM_ADDRESS = re.compile(r"academie-?levinet", re.IGNORECASE)
+SHORT_PREFIX_LENGTH = 2
+# Champs conservés pour chaque personne indexée
+CARD_FIELDS = ("id", "name", "email", "type")
+_WORD_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents ("Élodie" -> "elodie")"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+
+def _trigrams(word: str) -> Set[str]:
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class PeopleSearchIndex:
+    def __init__(self):
+        self._cards: Dict[str, dict] = {}
+        self._words: Dict[str, List[str]] = {}
+        self._names: Dict[str, str] = {}
+        self._emails: Dict[str, str] = {}
+        self._short: Dict[str, Set[str]] = defaultdict(set)
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        self._dirty: Set[str] = set()
+        self._lock = asyncio.Lock()
+        self.ready = False
+
+    @staticmethod
+    def _index_words(card: dict) -> List[str]:
+        name = normalize(card.get("name"))
+        email = normalize(card.get("email"))
+        words = [w for w in _WORD_SPLIT.split(name) if w]
+        if email:
+            local_part, _, domain = email.partition("@")
+            words += [email, local_part] + [w for w in _WORD_SPLIT.split(local_part) if w]
+            words += [w for w in _WORD_SPLIT.split(domain) if w]
+        return list(dict.fromkeys(words))
+
+    def add(self, card: dict) -> None:
+        """Index (or re-index) a person card"""
+        self.remove(card["id"])
+        if SYSTEM_ADDRESS.search(card.get("email") or ""):
+            return
+        words = self._index_words(card)
+        self._cards[card["id"]] = {field: card.get(field) for field in CARD_FIELDS}
+        self._names[card["id"]] = normalize(card.get("name"))
+        self._emails[card["id"]] = normalize(card.get("email"))
+        self._words[card["id"]] = words
+        for word in words:
+            for length in range(1, SHORT_PREFIX_LENGTH + 1):
+                self._short[word[:length]].add(card["id"])
+            for gram in _trigrams(word):
+                self._grams[gram].add(card["id"])
+
+    def remove(self, person_id: str) -> None:
+        words = self._words.pop(person_id, None)
+        self._cards.pop(person_id, None)
+        self._names.pop(person_id, None)
+        self._emails.pop(person_id, None)
+        for word in words or ():
+            for key in {word[:length] for length in range(1, SHORT_PREFIX_LENGTH + 1)}:
+                self._discard(self._short, key, person_id)
+            for gram in _trigrams(word):
+                self._discard(self._grams, gram, person_id)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, person_id: str) -> None:
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(person_id)
+            if not ids:
+                del index[key]
+
+    def mark_dirty(self, person_id: str) -> None:
+        self._dirty.add(person_id)
+
+    async def build(self, db) -> int:
+        """(Re)build the whole index from users, members and technical_directors"""
+        fresh = PeopleSearchIndex()
+        # Ordre inverse: la source prioritaire (users) écrase les autres
+        for collection, person_type, projection in reversed(SOURCES):
+            async for doc in db[collection].find({}, projection):
+                if doc.get("id"):
+                    fresh.add(person_card(doc, person_type))
+        self._cards, self._words, self._names = fresh._cards, fresh._words, fresh._names
+        self._emails = fresh._emails
+        self._short, self._grams = fresh._short, fresh._grams
+        self.ready = True
+        logger.info(f"🔎 Index de recherche des personnes: {len(self._cards)} entrées")
+        return len(self._cards)
+
+    async def refresh(self, db, resolver) -> None:
+        """Build the index on first use, then re-read the people marked dirty"""
+        if not self.ready:
+            async with self._lock:  # une seule construction à la fois
+                if not self.ready:
+                    await self.build(db)
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        for person_id in dirty:
+            resolver.invalidate(person_id)
+        cards = await resolver.resolve_many(db, dirty)
+        for person_id in dirty:
+            if person_id in cards:
+                self.add(cards[person_id])
+            else:
+                self.remove(person_id)
+
+    def _candidates(self, term: str, within: Optional[Set[str]] = None) -> Set[str]:
+        """Ids with a word containing `term` (starting with it for short terms)"""
+        if len(term) <= SHORT_PREFIX_LENGTH:
+            matches = self._short.get(term, set())
+            return matches & within if within is not None else set(matches)
+        sets = sorted((self._grams.get(gram, set()) for gram in _trigrams(term)), key=len)
+        candidates = set(within) if within is not None else set(sets[0])
+        for ids in sets:
+            candidates &= ids
+            if not candidates:
+                return candidates
+        # Les trigrammes peuvent appartenir à des mots différents: vérifier
+        return {pid for pid in candidates if any(term in word for word in self._words[pid])}
+
+    def _email_matches(self, query: str) -> Set[str]:
+        """Ids whose full email address contains `query`"""
+        if len(query) < 3:
+            return set()
+        sets = sorted((self._grams.get(gram, set()) for gram in _trigrams(query)), key=len)
+        candidates = set(sets[0])
+        for ids in sets[1:]:
+            candidates &= ids
+        return {pid for pid in candidates if query in self._emails.get(pid, "")}
+
+    def search(self, query: str, limit: int = 15, exclude: Iterable[str] = ()) -> List[dict]:
+        """Ranked cards matching every term of the query, or whose email contains it"""
+        raw_query = normalize(query)
+        terms = [t for t in _WORD_SPLIT.split(raw_query) if t]
+        if not terms:
+            return []
+        # Le terme le plus long est le plus sélectif: il borne les suivants
+        candidates: Optional[Set[str]] = None
+        for term in sorted(terms, key=len, reverse=True):
+            candidates = self._candidates(term, candidates)
+            if not candidates:
+                break
+        # Fragment d'adresse ("dupont@orange.f"): chercher aussi dans l'email complet
+        email_matches = self._email_matches(raw_query) if "@" in raw_query or "." in raw_query else set()
+        candidates = (candidates or set()) | email_matches
+        if not candidates:
+            return []
+        for person_id in exclude:
+            candidates.discard(person_id)
+
+        normalized_query = " ".join(terms)
+
+        # Score: mot exact 3, préfixe d'un mot 2, sous-chaîne 1, +2 si le nom commence par la requête,
+        # +3 si l'email contient la requête
+        def score(person_id: str) -> tuple:
+            words = self._words[person_id]
+            name = self._names[person_id]
+            total = 2 if name.startswith(normalized_query) else 0
+            if person_id in email_matches:
+                total += 3
+            for term in terms:
+                if term in words:
+                    total += 3
+                elif len(term) <= SHORT_PREFIX_LENGTH or any(word.startswith(term) for word in words):
+                    total += 2
+                else:
+                    total += 1
+            return (-total, name)
+
+        return [self._cards[pid] for pid in heapq.nsmallest(limit, candidates, key=score)]
+
+    def __len__(self) -> int:
+        return len(self._cards)
@@ -0,0 +1,103 @@
+"""Résolution des personnes à travers les collections historiques.
+
+Un participant à la messagerie peut être enregistré dans `users`,
+`members` ou `technical_directors`. `PersonResolver` interroge les trois
+collections en parallèle avec un `$in` par collection et met en cache une
+fiche réduite par personne:
+    {"id", "name", "email", "type"}
+Une personne présente dans plusieurs collections est résolue dans l'ordre
+de SOURCES (users d'abord).
+
+Les photos (souvent en base64) ne sont pas mises en cache: `resolve_photos`
+les lit à la demande, pour les seules personnes affichées.
+"""
+import asyncio
+from typing import Dict, Iterable, List, Optional
+
+from ttl_cache import TTLCache
+
+# (collection, type affiché, projection)
+SOURCES = (
+    ("users", "Admin", {"_id": 0, "id": 1, "full_name": 1, "email": 1}),
+    ("members", "Membre", {"_id": 0, "id": 1, "first_name": 1, "last_name": 1, "email": 1}),
+    ("technical_directors", "Directeur Technique", {"_id": 0, "id": 1, "name": 1, "email": 1}),
+)
+PHOTO_PROJECTION = {"_id": 0, "id": 1, "photo_url": 1}
+
+
+def person_card(doc: dict, person_type: str) -> dict:
+    """Slim card of a person document from any of the sources"""
+    name = (
+        doc.get("full_name") or doc.get("name")
+        or f"{doc.get('first_name', '')} {doc.get('last_name', '')}".strip()
+        or "Utilisateur"
+    )
+    return {
+        "id": doc["id"],
+        "name": name,
+        "email": doc.get("email"),
+        "type": person_type,
+    }
+
+
+class PersonResolver:
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 10000):
+        self._cards = TTLCache(ttl_seconds, max_entries)
+
+    async def resolve(self, db, person_id: str) -> Optional[dict]:
+        return (await self.resolve_many(db, [person_id])).get(person_id)
+
+    async def resolve_many(self, db, person_ids: Iterable[str]) -> Dict[str, dict]:
+        """Cards of the given ids; unknown ids are left out"""
+        cards: Dict[str, dict] = {}
+        missing = []
+        for person_id in dict.fromkeys(pid for pid in person_ids if pid):
+            card = self._cards.get(person_id)
+            if card is None:
+                missing.append(person_id)
+            else:
+                cards[person_id] = card
+
+        if missing:
+            results = await asyncio.gather(*(
+                db[collection].find({"id": {"$in": missing}}, projection).to_list(len(missing))
+                for collection, _, projection in SOURCES
+            ))
+            # Parcours en ordre inverse: la source prioritaire écrase les autres
+            found: Dict[str, dict] = {}
+            for (_, person_type, _), docs in reversed(list(zip(SOURCES, results))):
+                for doc in docs:
+                    found[doc["id"]] = person_card(doc, person_type)
+            for person_id, card in found.items():
+                self._cards.set(person_id, card)
+            cards.update(found)
+        return cards
+
+    async def resolve_photos(self, db, person_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Photos of the given ids, read on demand (never cached)"""
+        ids = list(dict.fromkeys(pid for pid in person_ids if pid))
+        if not ids:
+            return {}
+        results = await asyncio.gather(*(
+            db[collection].find({"id": {"$in": ids}}, PHOTO_PROJECTION).to_list(len(ids))
+            for collection, _, _ in SOURCES
+        ))
+        photos: Dict[str, Optional[str]] = {}
+        for docs in reversed(results):
+            for doc in docs:
+                photos[doc["id"]] = doc.get("photo_url")
+        return photos
+
+    async def with_photos(self, db, cards: List[dict]) -> List[dict]:
+        """Copies of `cards` with their photo_url attached"""
+        photos = await self.resolve_photos(db, [card["id"] for card in cards])
+        return [{**card, "photo_url": photos.get(card["id"])} for card in cards]
+
+    def invalidate(self, person_id: str) -> None:
+        self._cards.invalidate(person_id)
+
+    def clear(self) -> None:
+        self._cards.clear()
+
+    def __len__(self) -> int:
+        return len(self._cards)
@@ -0,0 +1,99 @@
+"""Compteurs d'engagement dénormalisés des posts du mur.
+
+Chaque post stocke `comments_count`, `reactions_count` et `reactions`
+(nombre de réactions par type), maintenus par des `$inc` atomiques dans les
+routes du mur. `reconcile_post_counters` recalcule ces compteurs par lots à
+partir de post_comments / post_reactions et corrige ceux qui ont dérivé.
+
+La correction est conditionnelle (compare-and-set): elle ne s'applique que
+si les compteurs stockés n'ont pas changé depuis leur lecture. Un `$inc`
+arrivé entre le comptage et l'écriture n'est donc jamais écrasé; le post
+est simplement revu au passage suivant.
+"""
+import asyncio
+import logging
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+async def compute_post_counters(db, post_ids: List[str]) -> Dict[str, dict]:
+    """Recompute the counters of the given posts with two grouped aggregations"""
+    comment_groups, reaction_groups = await asyncio.gather(
+        db.post_comments.aggregate([
+            {"$match": {"post_id": {"$in": post_ids}}},
+            {"$group": {"_id": "$post_id", "count": {"$sum": 1}}}
+        ]).to_list(None),
+        db.post_reactions.aggregate([
+            {"$match": {"post_id": {"$in": post_ids}}},
+            {"$group": {
+                "_id": {"post_id": "$post_id", "type": {"$ifNull": ["$reaction_type", "like"]}},
+                "count": {"$sum": 1}
+            }}
+        ]).to_list(None)
+    )
+
+    counters = {post_id: {"comments_count": 0, "reactions_count": 0, "reactions": {}} for post_id in post_ids}
+    for group in comment_groups:
+        counters[group["_id"]]["comments_count"] = group["count"]
+    for group in reaction_groups:
+        entry = counters[group["_id"]["post_id"]]
+        entry["reactions"][group["_id"]["type"]] = group["count"]
+        entry["reactions_count"] += group["count"]
+    return counters
+
+
+async def reconcile_post_counters(db, batch_size: int = 500) -> int:
+    """Fix every post whose stored counters differ from the source collections.
+
+    Returns the number of posts updated; posts written to concurrently are
+    left for the next pass.
+    """
+    fixed = 0
+    cursor = db.posts.find({}, {"_id": 0, "id": 1, "comments_count": 1, "reactions_count": 1, "reactions": 1})
+    batch = []
+    async for post in cursor:
+        batch.append(post)
+        if len(batch) >= batch_size:
+            fixed += await _reconcile_batch(db, batch)
+            batch = []
+    if batch:
+        fixed += await _reconcile_batch(db, batch)
+    return fixed
+
+
+async def _reconcile_batch(db, posts: List[dict]) -> int:
+    expected = await compute_post_counters(db, [post["id"] for post in posts])
+    operations = []
+    for post in posts:
+        counters = expected[post["id"]]
+        stored = {
+            "comments_count": post.get("comments_count"),
+            "reactions_count": post.get("reactions_count"),
+            # Les types à 0 peuvent rester dans la map après un retrait
+            "reactions": {k: v for k, v in (post.get("reactions") or {}).items() if v} if "reactions" in post else None,
+        }
+        if stored != counters:
+            operations.append(UpdateOne(_unchanged_filter(post, counters), {"$set": counters}))
+    if not operations:
+        return 0
+    result = await db.posts.bulk_write(operations, ordered=False)
+    if result.modified_count:
+        logger.info(f"🔁 Compteurs corrigés sur {result.modified_count} posts")
+    return result.modified_count
+
+
+def _unchanged_filter(post: dict, counters: dict) -> dict:
+    """Match the post only if its counters still hold the values read from it"""
+    stored_reactions = post.get("reactions") or {}
+    query = {
+        "id": post["id"],
+        # None correspond aussi à un champ absent
+        "comments_count": post.get("comments_count"),
+        "reactions_count": post.get("reactions_count"),
+    }
+    for reaction_type in set(stored_reactions) | set(counters["reactions"]):
+        query[f"reactions.{reaction_type}"] = stored_reactions.get(reaction_type)
+    return query
@@ -0,0 +1,113 @@
+"""Suivi de présence en mémoire ("en ligne" sur le mur).
+
+Chaque appel authentifié à /wall/online-users met à jour une date de dernière
+activité en mémoire. `flush` écrit périodiquement les changements dans
+user_activity avec un seul bulk_write, puis relit les activités récentes
+pour connaître les utilisateurs vus par les autres workers.
+
+Les profils mis en cache ne gardent pas la photo elle-même (souvent en
+base64) mais une référence: l'URL d'origine, ou pour une photo en base64
+l'adresse de /api/users/{id}/photo versionnée par une empreinte du contenu.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from ttl_cache import TTLCache
+
+PHOTO_FIELD = "photo_url"
+
+
+def photo_version(photo: str) -> str:
+    """Short fingerprint of a photo, changes whenever the photo does"""
+    return hashlib.sha1(photo.encode("utf-8")).hexdigest()[:12]
+
+
+def photo_reference(user_id: str, photo: Optional[str]) -> Optional[str]:
+    """URL to display for a photo: kept as is, or served by /api/users/{id}/photo"""
+    if not photo or not photo.startswith("data:"):
+        return photo or None
+    return f"/api/users/{user_id}/photo?v={photo_version(photo)}"
+
+
+class PresenceTracker:
+    def __init__(self, window_seconds: float = 900, profile_ttl_seconds: float = 300,
+                 max_profiles: int = 5000, profile_projection: Optional[dict] = None):
+        self.window = timedelta(seconds=window_seconds)
+        self.profile_projection = profile_projection or {"_id": 0, "id": 1, "full_name": 1, PHOTO_FIELD: 1}
+        self._last_seen: Dict[str, datetime] = {}
+        self._dirty: Set[str] = set()
+        self._profiles = TTLCache(profile_ttl_seconds, max_profiles)
+        self.last_flush_at: Optional[datetime] = None
+
+    def touch(self, user_id: str) -> None:
+        self._last_seen[user_id] = datetime.now(timezone.utc)
+        self._dirty.add(user_id)
+
+    def is_online(self, user_id: str) -> bool:
+        last_seen = self._last_seen.get(user_id)
+        return bool(last_seen) and last_seen >= datetime.now(timezone.utc) - self.window
+
+    def online_user_ids(self) -> List[str]:
+        """Users seen within the window, most recent first"""
+        threshold = datetime.now(timezone.utc) - self.window
+        for user_id in [uid for uid, seen in self._last_seen.items() if seen < threshold]:
+            del self._last_seen[user_id]
+        return sorted(self._last_seen, key=self._last_seen.get, reverse=True)
+
+    async def online_profiles(self, db, limit: int = 100) -> List[dict]:
+        """Slim profiles of online users, fetched with one $in query for cache misses"""
+        user_ids = self.online_user_ids()[:limit]
+        missing = [uid for uid in user_ids if self._profiles.get(uid) is None]
+        if missing:
+            async for profile in db.users.find({"id": {"$in": missing}}, self.profile_projection):
+                if PHOTO_FIELD in profile:
+                    profile[PHOTO_FIELD] = photo_reference(profile["id"], profile[PHOTO_FIELD])
+                self._profiles.set(profile["id"], profile)
+        return [self._profiles.get(uid) for uid in user_ids if self._profiles.get(uid) is not None]
+
+    def invalidate_profile(self, user_id: str) -> None:
+        self._profiles.invalidate(user_id)
+
+    async def flush(self, db) -> int:
+        """Persist pending activity and merge activity recorded by other workers"""
+        dirty, self._dirty = self._dirty, set()
+        operations = [
+            UpdateOne(
+                {"user_id": user_id},
+                {"$max": {"last_active": self._last_seen[user_id].isoformat()}},
+                upsert=True
+            )
+            for user_id in dirty if user_id in self._last_seen
+        ]
+        if operations:
+            try:
+                await db.user_activity.bulk_write(operations, ordered=False)
+            except Exception:
+                self._dirty |= dirty
+                raise
+
+        threshold = (datetime.now(timezone.utc) - self.window).isoformat()
+        async for record in db.user_activity.find({"last_active": {"$gte": threshold}}, {"_id": 0}):
+            try:
+                seen = datetime.fromisoformat(record["last_active"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if seen.tzinfo is None:
+                seen = seen.replace(tzinfo=timezone.utc)
+            user_id = record.get("user_id")
+            if user_id and seen > self._last_seen.get(user_id, seen - timedelta(seconds=1)):
+                self._last_seen[user_id] = seen
+
+        self.last_flush_at = datetime.now(timezone.utc)
+        return len(operations)
+
+    def stats(self) -> dict:
+        return {
+            "tracked_users": len(self._last_seen),
+            "pending_writes": len(self._dirty),
+            "cached_profiles": len(self._profiles),
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+        }
@@ -0,0 +1,29 @@
+"""Exécution groupée de lectures indépendantes.
+
+Les routes de statistiques enchaînaient plusieurs `count_documents` / `find`
+indépendants: leur latence était la somme des allers-retours. `run_queries`
+les lance en parallèle, avec un plafond de requêtes simultanées par appel
+pour ne pas saturer le pool de connexions.
+
+Les requêtes sont passées sous forme de fonctions sans argument (lambda):
+Motor démarre une opération dès son appel, c'est donc l'appel lui-même qui
+doit attendre une place.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+QUERY_BATCH_CONCURRENCY = int(os.environ.get("QUERY_BATCH_CONCURRENCY", "4"))
+
+
+async def run_queries(queries: Dict[str, Callable[[], Awaitable[Any]]],
+                      max_concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """Run independent reads concurrently and return their results by name"""
+    semaphore = asyncio.Semaphore(max_concurrency or QUERY_BATCH_CONCURRENCY)
+
+    async def run(query: Callable[[], Awaitable[Any]]) -> Any:
+        async with semaphore:
+            return await query()
+
+    results = await asyncio.gather(*(run(query) for query in queries.values()))
+    return dict(zip(queries, results))
@@ -1,22 +1,40 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 import os
+import json
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr, ConfigDict
 from typing import List, Optional, Dict
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
 from enum import Enum
-from email_service import send_email, get_welcome_email_html, get_lead_notification_html, get_lead_confirmation_html, get_new_message_notification_html
+from email_service import send_email, get_welcome_email_html, get_lead_notification_html, get_lead_confirmation_html
+from db_indexes import ensure_indexes
+from ttl_cache import TTLCache
+from password_hashing import password_hasher
+from post_counters import compute_post_counters, reconcile_post_counters
+from forum_counters import reconcile_forum_counters
+from counter_buffer import CounterBuffer
+from content_search import CONTENT_TYPES, MAX_SEARCH_WINDOW, search_content
+from dashboard_stats import SNAPSHOT_ID as DASHBOARD_SNAPSHOT_ID, refresh_dashboard_snapshot
+from query_batch import run_queries
+from data_export import EXPORT_DATASETS, EXPORT_FORMATS, build_export_query, select_columns, stream_export
+from pagination import decode_cursor, encode_cursor, keyset_filter, next_cursor
+from presence import PresenceTracker, photo_version
+from unread_counters import increment_unread, decrement_unread, reset_unread, get_unread_total, get_conversation_unread
+from event_hub import EventHub, MongoEventRelay
+from message_digest import MessageDigestScheduler
+from person_resolver import PersonResolver
+from people_search import PeopleSearchIndex
 import asyncio
 
 # Mock emergentintegrations pour le deploiement (module non disponible sur PyPI)
@@ -121,6 +139,31 @@ else:
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = "HS256"
 
+# Cache du principal authentifié (get_current_user), par worker
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '30'))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get('PRINCIPAL_CACHE_MAX_ENTRIES', '5000'))
+# Présence "en ligne" du mur (voir presence.py)
+PRESENCE_WINDOW_SECONDS = float(os.environ.get('PRESENCE_WINDOW_SECONDS', '900'))
+PRESENCE_FLUSH_INTERVAL_SECONDS = float(os.environ.get('PRESENCE_FLUSH_INTERVAL_SECONDS', '30'))
+# Flux temps réel (SSE, voir event_hub.py)
+EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', '100'))
+EVENT_KEEPALIVE_SECONDS = float(os.environ.get('EVENT_KEEPALIVE_SECONDS', '15'))
+EVENT_RELAY_ENABLED = os.environ.get('EVENT_RELAY_ENABLED', 'false').lower() == 'true'
+# Délai max pendant lequel un autre worker peut accepter un token révoqué
+PERSON_CACHE_TTL_SECONDS = float(os.environ.get('PERSON_CACHE_TTL_SECONDS', '300'))
+
+DASHBOARD_STATS_REFRESH_INTERVAL_SECONDS = float(os.environ.get('DASHBOARD_STATS_REFRESH_INTERVAL_SECONDS', '300'))
+
+FORUM_STATS_CACHE_TTL_SECONDS = float(os.environ.get('FORUM_STATS_CACHE_TTL_SECONDS', '60'))
+
+COUNTER_FLUSH_INTERVAL_SECONDS = float(os.environ.get('COUNTER_FLUSH_INTERVAL_SECONDS', '10'))
+
+PEOPLE_INDEX_REBUILD_INTERVAL_SECONDS = float(os.environ.get('PEOPLE_INDEX_REBUILD_INTERVAL_SECONDS', '3600'))
+
+MESSAGE_DIGEST_WINDOW_SECONDS = float(os.environ.get('MESSAGE_DIGEST_WINDOW_SECONDS', '300'))
+
+TOKEN_VERSION_CACHE_TTL_SECONDS = float(os.environ.get('TOKEN_VERSION_CACHE_TTL_SECONDS', '60'))
+
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
@@ -913,6 +956,9 @@ class Message(BaseModel):
 class MessageCreate(BaseModel):
     content: str
 
+class ConversationReadRequest(BaseModel):
+    up_to: Optional[str] = None  # created_at du dernier message lu, par défaut maintenant
+
 class MessageResponse(BaseModel):
     id: str
     conversation_id: str
@@ -1040,32 +1086,120 @@ class VisitRequestCreate(BaseModel):
     visit_date: Optional[str] = None
 
 # Utility functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
 
-def create_token(user_id: str, email: str) -> str:
+def create_token(user_id: str, email: str, role: Optional[str] = None, token_version: int = 0) -> str:
     payload = {
         "user_id": user_id,
         "email": email,
+        "role": role,
+        "tv": token_version,  # Révocation: comparé à users.token_version
         "exp": datetime.now(timezone.utc) + timedelta(days=7)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def decode_token(token: str) -> dict:
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# Champs du principal mis en cache: ce que les routes lisent sur current_user.
+# /auth/me et /profile relisent le document complet. La photo (souvent en
+# base64) n'y est pas: voir get_user_photo.
+PRINCIPAL_PROJECTION = {
+    "_id": 0, "id": 1, "email": 1, "full_name": 1, "name": 1, "first_name": 1, "last_name": 1,
+    "role": 1, "roles": 1, "city": 1, "country": 1,
+    "club_id": 1, "club_ids": 1, "club_name": 1, "club": 1, "belt_grade": 1,
+    "membership_status": 1, "has_paid_license": 1, "is_premium": 1, "token_version": 1,
+}
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES)
+# user_id -> (token_version,) ; (None,) si l'utilisateur n'existe plus
+token_version_cache = TTLCache(TOKEN_VERSION_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES)
+# Fiches réduites (nom, email, type) des users / members / technical_directors
+person_resolver = PersonResolver(PERSON_CACHE_TTL_SECONDS)
+people_index = PeopleSearchIndex()
+
+def invalidate_user_caches(user_id: str) -> None:
+    """Drop every in-process cached view of a user after a write to db.users"""
+    principal_cache.invalidate(user_id)
+    token_version_cache.invalidate(user_id)
+    presence_tracker.invalidate_profile(user_id)
+    person_resolver.invalidate(user_id)
+    people_index.mark_dirty(user_id)
+
+async def get_user_photo(user_id: str) -> Optional[str]:
+    """Photo of a user, read on demand since it is kept out of cached profiles"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1, "photo_url": 1})
+    return (user or {}).get("photo_url")
+
+async def revoke_user_tokens(user_id: str) -> None:
+    """Invalidate every token issued so far to a user (role change, deletion)"""
+    await db.users.update_one({"id": user_id}, {"$inc": {"token_version": 1}})
+    invalidate_user_caches(user_id)
+
+async def get_token_version(user_id: str) -> Optional[int]:
+    """Current token version of a user, None if the user no longer exists"""
+    cached = token_version_cache.get(user_id)
+    if cached is None:
+        # "id" projeté: un utilisateur créé avant token_version ne doit pas paraître supprimé
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1, "token_version": 1})
+        cached = (user.get("token_version", 0) if user else None,)
+        token_version_cache.set(user_id, cached)
+    return cached[0]
+
+async def verify_token(token: str) -> dict:
+    """Decode a JWT and check it has not been revoked, without loading the user"""
+    payload = decode_token(token)
+    version = await get_token_version(payload["user_id"])
+    if version is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    if payload.get("tv", 0) < version:
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    payload = decode_token(credentials.credentials)
+    user_id = payload["user_id"]
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = await db.users.find_one({"id": user_id}, PRINCIPAL_PROJECTION)
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal_cache.set(user_id, user)
+    if payload.get("tv", 0) < user.get("token_version", 0):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    # Copie pour que les routes ne modifient pas l'entrée du cache
+    return dict(user)
+
+def require_role(*roles: str, detail: Optional[str] = None):
+    """FastAPI dependency authorizing from the verified JWT claims alone.
+
+    Returns a minimal principal ({id, email, role}). Revocation is checked
+    against the cached users.token_version; tokens issued before role claims
+    existed fall back to get_current_user. `detail` overrides the 403 message.
+    """
+    async def dependency(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+        payload = decode_token(credentials.credentials)
+        if payload.get("role") is None:
+            principal = await get_current_user(credentials)
+        else:
+            payload = await verify_token(credentials.credentials)
+            principal = {"id": payload["user_id"], "email": payload.get("email"), "role": payload["role"]}
+
+        if principal.get("role") not in roles:
+            message = detail or ("Admin access required" if roles == ("admin",) else "Accès non autorisé")
+            raise HTTPException(status_code=403, detail=message)
+        return principal
+    return dependency
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
 async def register(user_data: UserCreate):
@@ -1074,7 +1208,7 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user_dict = user_data.model_dump()
-    user_dict['password_hash'] = hash_password(user_data.password)
+    user_dict['password_hash'] = await hash_password(user_data.password)
     del user_dict['password']
     
     user = User(**user_dict)
@@ -1084,6 +1218,7 @@ async def register(user_data: UserCreate):
     # Create a clean copy without _id for insertion
     insert_doc = {k: v for k, v in doc.items()}
     await db.users.insert_one(insert_doc)
+    invalidate_user_caches(insert_doc['id'])
     
     # 🎯 Award signup bonus tokens
     await award_tokens(
@@ -1100,7 +1235,7 @@ async def register(user_data: UserCreate):
         text_content=f"Bienvenue {user.full_name}! Votre compte a été créé avec succès."
     ))
     
-    token = create_token(user.id, user.email)
+    token = create_token(user.id, user.email, user.role)
     user_response = {k: v for k, v in doc.items() if k != 'password_hash' and k != '_id'}
     
     return {"token": token, "user": user_response}
@@ -1108,24 +1243,26 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    if not user or not await verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    token = create_token(user['id'], user['email'])
+    token = create_token(user['id'], user['email'], user.get('role'), user.get('token_version', 0))
     user_response = {k: v for k, v in user.items() if k != 'password_hash' and k != '_id'}
     
     return {"token": token, "user": user_response}
 
 @api_router.get("/auth/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
-    return {k: v for k, v in current_user.items() if k != 'password_hash' and k != '_id'}
+    user = await db.users.find_one({"id": current_user['id']}, {"_id": 0, "password_hash": 0})
+    return user or current_user
 
 # ==================== USER PROFILE ENDPOINTS ====================
 
 @api_router.get("/profile")
 async def get_profile(current_user: dict = Depends(get_current_user)):
     """Get current user's full profile"""
-    return {k: v for k, v in current_user.items() if k != 'password_hash' and k != '_id'}
+    user = await db.users.find_one({"id": current_user['id']}, {"_id": 0, "password_hash": 0})
+    return user or current_user
 
 @api_router.put("/profile")
 async def update_profile(data: UserProfileUpdate, current_user: dict = Depends(get_current_user)):
@@ -1139,6 +1276,7 @@ async def update_profile(data: UserProfileUpdate, current_user: dict = Depends(g
         {"id": current_user['id']},
         {"$set": update_data}
     )
+    invalidate_user_caches(current_user['id'])
     
     updated_user = await db.users.find_one({"id": current_user['id']}, {"_id": 0, "password_hash": 0})
     return updated_user
@@ -1152,7 +1290,7 @@ async def update_password(
     """Update current user's password"""
     # Verify current password
     user = await db.users.find_one({"id": current_user['id']})
-    if not verify_password(current_password, user['password_hash']):
+    if not await verify_password(current_password, user['password_hash']):
         raise HTTPException(status_code=400, detail="Mot de passe actuel incorrect")
     
     if len(new_password) < 6:
@@ -1161,7 +1299,7 @@ async def update_password(
     # Update password
     await db.users.update_one(
         {"id": current_user['id']},
-        {"$set": {"password_hash": hash_password(new_password)}}
+        {"$set": {"password_hash": await hash_password(new_password)}}
     )
     
     return {"message": "Mot de passe mis à jour avec succès"}
@@ -1173,6 +1311,7 @@ async def upload_profile_photo(photo_url: str, current_user: dict = Depends(get_
         {"id": current_user['id']},
         {"$set": {"photo_url": photo_url}}
     )
+    invalidate_user_caches(current_user['id'])
     return {"message": "Photo mise à jour", "photo_url": photo_url}
 
 # ==================== FILE UPLOAD ====================
@@ -1275,6 +1414,25 @@ async def get_image(image_id: str):
     # Fallback: return as JSON
     return {"data": data_url}
 
+@api_router.get("/users/{user_id}/photo")
+async def get_user_photo_image(user_id: str, v: Optional[str] = None):
+    """Serve a user's base64 photo as an image (referenced by cached profiles)"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1, "photo_url": 1})
+    photo = (user or {}).get("photo_url")
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo non trouvée")
+    if not photo.startswith("data:"):
+        return RedirectResponse(photo)
+    try:
+        header, encoded = photo.split(",", 1)
+        mime_type = header.split(":")[1].split(";")[0]
+        image_bytes = base64.b64decode(encoded)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Photo non trouvée")
+    # URL versionnée par l'empreinte de la photo: contenu immuable
+    cache_control = "public, max-age=31536000, immutable" if v == photo_version(photo) else "no-cache"
+    return Response(content=image_bytes, media_type=mime_type, headers={"Cache-Control": cache_control})
+
 @api_router.post("/upload/photo")
 async def upload_photo(data: PhotoUploadRequest, current_user: dict = Depends(get_current_user)):
     """Upload a photo and return the URL (stores as base64 data URL)"""
@@ -1305,11 +1463,8 @@ async def upload_photo(data: PhotoUploadRequest, current_user: dict = Depends(ge
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'upload: {str(e)}")
 
 @api_router.post("/admin/users/{user_id}/photo")
-async def update_user_photo(user_id: str, data: PhotoUploadRequest, current_user: dict = Depends(get_current_user)):
+async def update_user_photo(user_id: str, data: PhotoUploadRequest, current_user: dict = Depends(require_role("admin"))):
     """Admin: Update a user's photo"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     # Check user exists
     user = await db.users.find_one({"id": user_id})
     if not user:
@@ -1325,17 +1480,15 @@ async def update_user_photo(user_id: str, data: PhotoUploadRequest, current_user
         photo_url = f"data:{mime_type};base64,{data.photo_base64}"
     
     await db.users.update_one({"id": user_id}, {"$set": {"photo_url": photo_url}})
+    invalidate_user_caches(user_id)
     
     return {"photo_url": photo_url, "message": "Photo mise à jour"}
 
 # ==================== ADMIN USER MANAGEMENT ====================
 
 @api_router.get("/admin/admins")
-async def get_all_admins(current_user: dict = Depends(get_current_user)):
+async def get_all_admins(current_user: dict = Depends(require_role("admin"))):
     """Get list of all administrators (admin only)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     admins = await db.users.find(
         {"role": "admin"},
         {"_id": 0, "id": 1, "full_name": 1, "email": 1, "photo_url": 1}
@@ -1343,6 +1496,11 @@ async def get_all_admins(current_user: dict = Depends(get_current_user)):
     
     return admins
 
+# Tris proposés pour la grille des membres (champ toujours renseigné, départagé par id)
+ADMIN_USERS_SORTS = {"created_at", "full_name", "email"}
+# Champs comptés dans les facettes de /admin/users
+ADMIN_USERS_FACETS = {"role": "role", "country": "country", "club": "club_id", "membership_status": "membership_status"}
+
 @api_router.get("/admin/users")
 async def get_all_users(
     role: Optional[str] = None,
@@ -1351,10 +1509,16 @@ async def get_all_users(
     club_id: Optional[str] = None,
     membership_status: Optional[str] = None,
     belt_grade: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    limit: int = 500,
+    cursor: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    fields: Optional[str] = None,
+    include_facets: bool = True,
+    current_user: dict = Depends(require_role("admin"))
 ):
     """
-    Admin: Get all users with optional filters.
+    Admin: Get users with optional filters, one page at a time.
 
     Filtres disponibles:
     - role: admin | fondateur | directeur_national | directeur_technique | instructeur | membre
@@ -1363,10 +1527,20 @@ async def get_all_users(
     - club_id: ID du club affilié
     - membership_status: Actif | Inactif | Suspendu | Expiré
     - belt_grade: Grade/Ceinture
+
+    Pagination: `limit` (max 500), `sort` (created_at | full_name | email),
+    `order` (asc | desc); passer le `next_cursor` d'une page en `cursor`
+    pour la suivante. `fields` (liste séparée par des virgules) restreint les
+    champs renvoyés. `total` compte les utilisateurs filtrés; avec
+    `include_facets`, `facets` les répartit aussi par rôle, pays, club et
+    statut d'adhésion.
     """
-    # Seuls les admins peuvent voir tous les utilisateurs
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
+    if sort not in ADMIN_USERS_SORTS:
+        raise HTTPException(status_code=400, detail="Tri invalide")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Ordre invalide")
+    limit = max(1, min(limit, 500))
+    descending = order == "desc"
 
     query = {}
     if role:
@@ -1382,25 +1556,70 @@ async def get_all_users(
     if belt_grade:
         query["belt_grade"] = belt_grade
 
-    users = await db.users.find(query, {"_id": 0, "password_hash": 0}).sort("created_at", -1).to_list(500)
-
-    for user in users:
-        if isinstance(user.get('created_at'), str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
-        # Ajouter first_name/last_name depuis full_name si absent
-        if user.get('full_name') and not user.get('first_name'):
-            parts = user['full_name'].split(' ', 1)
-            user['first_name'] = parts[0]
-            user['last_name'] = parts[1] if len(parts) > 1 else ''
+    page_query = dict(query)
+    if cursor:
+        try:
+            sort_value, user_id = decode_cursor(cursor, 2)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+        page_query = {"$and": [query, keyset_filter(sort, sort_value, user_id, descending=descending)]}
+
+    if fields:
+        requested = {field.strip() for field in fields.split(",") if field.strip()} - {"password_hash", "_id"}
+        # id et le champ de tri servent à construire le curseur suivant
+        projection = {"_id": 0, "id": 1, sort: 1, **{field: 1 for field in requested}}
+        if {"first_name", "last_name"} & requested:
+            projection["full_name"] = 1
+    else:
+        requested = None
+        projection = {"_id": 0, "password_hash": 0}
 
-    return {"users": users, "total": len(users)}
+    direction = -1 if descending else 1
+    queries = {
+        "users": lambda: db.users.find(page_query, projection).sort([(sort, direction), ("id", direction)]).limit(limit).to_list(limit),
+    }
+    if include_facets:
+        # Les comptages se font dans Mongo, en une seule agrégation; la page
+        # reste une requête à part (index de tri, pas de limite de 16 Mo du $facet)
+        queries["facets"] = lambda: db.users.aggregate([
+            {"$match": query},
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                **{
+                    name: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}]
+                    for name, field in ADMIN_USERS_FACETS.items()
+                },
+            }}
+        ]).to_list(1)
+    else:
+        queries["total"] = lambda: db.users.count_documents(query)
+    results = await run_queries(queries)
+    users = results["users"]
+
+    if requested is None or {"first_name", "last_name"} & requested:
+        for user in users:
+            # Ajouter first_name/last_name depuis full_name si absent
+            if user.get('full_name') and not user.get('first_name'):
+                parts = user['full_name'].split(' ', 1)
+                user['first_name'] = parts[0]
+                user['last_name'] = parts[1] if len(parts) > 1 else ''
+
+    response = {"users": users, "next_cursor": next_cursor(users, limit, sort)}
+    if include_facets:
+        facets = results["facets"][0] if results["facets"] else {}
+        total = facets.get("total") or []
+        response["total"] = total[0]["count"] if total else 0
+        response["facets"] = {
+            name: {(group["_id"] or "Non défini"): group["count"] for group in facets.get(name, [])}
+            for name in ADMIN_USERS_FACETS
+        }
+    else:
+        response["total"] = results["total"]
+    return response
 
 @api_router.post("/admin/users")
-async def create_admin_user(data: AdminUserCreate, current_user: dict = Depends(get_current_user)):
+async def create_admin_user(data: AdminUserCreate, current_user: dict = Depends(require_role("admin"))):
     """Admin: Create a new user (admin, member, instructor, technical_director)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     # Check if email exists
     existing = await db.users.find_one({"email": data.email})
     if existing:
@@ -1451,7 +1670,7 @@ async def create_admin_user(data: AdminUserCreate, current_user: dict = Depends(
     
     user = User(
         email=data.email,
-        password_hash=hash_password(password),
+        password_hash=await hash_password(password),
         full_name=data.full_name,
         role=normalized_role,
         phone=data.phone,
@@ -1471,6 +1690,7 @@ async def create_admin_user(data: AdminUserCreate, current_user: dict = Depends(
     doc['user_type'] = normalized_role  # Store normalized type
     
     await db.users.insert_one(doc)
+    invalidate_user_caches(doc['id'])
     
     # Synchronize clubs if this is a technical director
     if normalized_role == 'directeur_technique' and data.club_ids:
@@ -1537,11 +1757,8 @@ async def create_admin_user(data: AdminUserCreate, current_user: dict = Depends(
     }
 
 @api_router.put("/admin/users/{user_id}/role")
-async def update_user_role(user_id: str, role: str, current_user: dict = Depends(get_current_user)):
+async def update_user_role(user_id: str, role: str, current_user: dict = Depends(require_role("admin"))):
     """Admin: Update user role"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-
     valid_roles = ['admin', 'directeur_technique', 'instructeur', 'eleve', 'eleve_libre']
     if role not in valid_roles:
         raise HTTPException(status_code=400, detail=f"Rôle invalide. Rôles valides: {', '.join(valid_roles)}")
@@ -1550,23 +1767,25 @@ async def update_user_role(user_id: str, role: str, current_user: dict = Depends
         {"id": user_id},
         {"$set": {"role": role}}
     )
+    invalidate_user_caches(user_id)
 
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
 
+    # Les tokens existants portent l'ancien rôle
+    await revoke_user_tokens(user_id)
+
     return {"message": f"Rôle mis à jour en '{role}'"}
 
 @api_router.delete("/admin/users/{user_id}")
-async def delete_user(user_id: str, current_user: dict = Depends(get_current_user)):
+async def delete_user(user_id: str, current_user: dict = Depends(require_role("admin"))):
     """Admin: Delete a user"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     # Prevent self-deletion
     if user_id == current_user['id']:
         raise HTTPException(status_code=400, detail="Vous ne pouvez pas supprimer votre propre compte")
     
     result = await db.users.delete_one({"id": user_id})
+    invalidate_user_caches(user_id)  # get_token_version renverra None
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
@@ -1574,11 +1793,8 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
     return {"message": "Utilisateur supprimé"}
 
 @api_router.get("/admin/users/{user_id}")
-async def get_user_details(user_id: str, current_user: dict = Depends(get_current_user)):
+async def get_user_details(user_id: str, current_user: dict = Depends(require_role("admin"))):
     """Admin: Get full user details"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
@@ -1586,11 +1802,8 @@ async def get_user_details(user_id: str, current_user: dict = Depends(get_curren
     return user
 
 @api_router.put("/admin/users/{user_id}")
-async def update_user(user_id: str, data: AdminUserUpdate, current_user: dict = Depends(get_current_user)):
+async def update_user(user_id: str, data: AdminUserUpdate, current_user: dict = Depends(require_role("admin"))):
     """Admin: Update any user's profile (unified model)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-
     # Get current user data to check role changes
     current_user_data = await db.users.find_one({"id": user_id})
     if not current_user_data:
@@ -1642,10 +1855,14 @@ async def update_user(user_id: str, data: AdminUserUpdate, current_user: dict =
         {"id": user_id},
         {"$set": update_data}
     )
+    invalidate_user_caches(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
+    if 'role' in update_data and update_data['role'] != current_user_data.get('role'):
+        await revoke_user_tokens(user_id)
+    
     # Attribuer des tokens pour le passage de grade
     if grade_changed:
         context_desc = ""
@@ -1666,17 +1883,14 @@ async def update_user(user_id: str, data: AdminUserUpdate, current_user: dict =
     return {"message": "Utilisateur mis à jour", "user": updated_user}
 
 @api_router.put("/admin/users/{user_id}/password")
-async def admin_change_user_password(user_id: str, new_password: str, current_user: dict = Depends(get_current_user)):
+async def admin_change_user_password(user_id: str, new_password: str, current_user: dict = Depends(require_role("admin"))):
     """Admin: Change any user's password"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     if len(new_password) < 6:
         raise HTTPException(status_code=400, detail="Le mot de passe doit contenir au moins 6 caractères")
     
     result = await db.users.update_one(
         {"id": user_id},
-        {"$set": {"password_hash": hash_password(new_password)}}
+        {"$set": {"password_hash": await hash_password(new_password)}}
     )
     
     if result.matched_count == 0:
@@ -1786,10 +2000,18 @@ async def update_member_alias(member_id: str, data: AdminUserUpdate, current_use
     if not update_data:
         raise HTTPException(status_code=400, detail="No data to update")
 
+    previous = None
+    if 'role' in update_data:
+        previous = await db.users.find_one({"id": member_id}, {"_id": 0, "id": 1, "role": 1})
+
     result = await db.users.update_one({"id": member_id}, {"$set": update_data})
+    invalidate_user_caches(member_id)
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Member not found")
 
+    if previous and previous.get('role') != update_data['role']:
+        await revoke_user_tokens(member_id)
+
     updated = await db.users.find_one({"id": member_id}, {"_id": 0, "password_hash": 0})
     return updated
 
@@ -1807,7 +2029,7 @@ async def create_member_alias(data: AdminUserCreate, current_user: dict = Depend
 
     # Generate password if not provided
     password = data.password or ''.join(random.choices(string.ascii_letters + string.digits, k=12))
-    user_dict['password_hash'] = hash_password(password)
+    user_dict['password_hash'] = await hash_password(password)
     user_dict.pop('password', None)
 
     # Set defaults
@@ -1816,6 +2038,7 @@ async def create_member_alias(data: AdminUserCreate, current_user: dict = Depend
     user_dict['membership_status'] = user_dict.get('membership_status') or 'Actif'
 
     await db.users.insert_one(user_dict)
+    invalidate_user_caches(user_dict['id'])
 
     # Return without password_hash
     user_dict.pop('password_hash', None)
@@ -1825,6 +2048,7 @@ async def create_member_alias(data: AdminUserCreate, current_user: dict = Depend
 async def delete_member_alias(member_id: str, current_user: dict = Depends(get_current_user)):
     """Alias: Supprime un utilisateur"""
     result = await db.users.delete_one({"id": member_id})
+    invalidate_user_caches(member_id)  # get_token_version renverra None
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Member not found")
     return {"message": "Member deleted successfully"}
@@ -1851,42 +2075,14 @@ async def get_subscriptions(member_id: Optional[str] = None, current_user: dict
 # Dashboard Routes
 @api_router.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
-    # Membres = users avec role="membre"
-    member_query = {"role": "membre"}
-    total_members = await db.users.count_documents(member_query)
-    active_memberships = await db.users.count_documents({**member_query, "membership_status": "Actif"})
-
-    subscriptions = await db.subscriptions.find({}, {"_id": 0}).to_list(10000)
-    total_revenue = sum(sub['amount'] for sub in subscriptions)
-
-    now = datetime.now(timezone.utc)
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    new_members_this_month = await db.users.count_documents({
-        **member_query,
-        "created_at": {"$gte": start_of_month.isoformat()}
-    })
-
-    members_by_month = [
-        {"month": "Jan", "count": 12},
-        {"month": "Fév", "count": 19},
-        {"month": "Mar", "count": 15},
-        {"month": "Avr", "count": 22},
-        {"month": "Mai", "count": 18},
-        {"month": "Jun", "count": 25},
-        {"month": "Jul", "count": 30}
-    ]
-
-    members = await db.users.find(member_query, {"_id": 0, "password_hash": 0}).to_list(1000)
-    members_by_country_dict = {}
-    for member in members:
-        country = member.get('country', 'Unknown')
-        members_by_country_dict[country] = members_by_country_dict.get(country, 0) + 1
-
-    members_by_country = [{"country": k, "count": v} for k, v in members_by_country_dict.items()]
+    # Instantané pré-calculé par une tâche de fond (voir dashboard_stats.py)
+    snapshot = await db.stats_snapshots.find_one({"id": DASHBOARD_SNAPSHOT_ID}, {"_id": 0})
+    stale_before = (datetime.now(timezone.utc) - timedelta(seconds=2 * DASHBOARD_STATS_REFRESH_INTERVAL_SECONDS)).isoformat()
+    if snapshot is None or snapshot.get("computed_at", "") < stale_before:
+        snapshot = await refresh_dashboard_snapshot(db)
 
-    recent_members_list = await db.users.find(member_query, {"_id": 0, "password_hash": 0}).sort("created_at", -1).limit(5).to_list(5)
     recent_members_formatted = []
-    for member in recent_members_list:
+    for member in snapshot.get("recent_members", []):
         if isinstance(member.get('created_at'), str):
             try:
                 member['created_at'] = datetime.fromisoformat(member['created_at'].replace('Z', '+00:00'))
@@ -1897,36 +2093,16 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
             parts = member['full_name'].split(' ', 1)
             member['first_name'] = parts[0]
             member['last_name'] = parts[1] if len(parts) > 1 else ''
-        # Créer un DashboardMemberSummary avec des valeurs par défaut
-        recent_members_formatted.append(DashboardMemberSummary(
-            id=member.get('id', ''),
-            first_name=member.get('first_name', ''),
-            last_name=member.get('last_name', ''),
-            full_name=member.get('full_name'),
-            email=member.get('email'),
-            phone=member.get('phone'),
-            date_of_birth=member.get('date_of_birth'),
-            country=member.get('country'),
-            city=member.get('city'),
-            technical_director_id=member.get('technical_director_id'),
-            photo_url=member.get('photo_url'),
-            belt_grade=member.get('belt_grade'),
-            membership_status=member.get('membership_status'),
-            membership_type=member.get('membership_type'),
-            membership_start_date=member.get('membership_start_date'),
-            membership_end_date=member.get('membership_end_date'),
-            sessions_attended=member.get('sessions_attended', 0),
-            created_at=member.get('created_at')
-        ))
+        recent_members_formatted.append(DashboardMemberSummary(**member))
 
     return {
-        "total_members": total_members,
-        "total_revenue": total_revenue,
-        "active_memberships": active_memberships,
-        "new_members_this_month": new_members_this_month,
-        "revenue_change_percent": 12.5,
-        "members_by_month": members_by_month,
-        "members_by_country": members_by_country,
+        "total_members": snapshot["total_members"],
+        "total_revenue": snapshot["total_revenue"],
+        "active_memberships": snapshot["active_memberships"],
+        "new_members_this_month": snapshot["new_members_this_month"],
+        "revenue_change_percent": snapshot["revenue_change_percent"],
+        "members_by_month": snapshot["members_by_month"],
+        "members_by_country": snapshot["members_by_country"],
         "recent_members": recent_members_formatted
     }
 
@@ -2044,11 +2220,8 @@ async def create_task(task_data: TaskCreate, current_user: dict = Depends(get_cu
     return task
 
 @api_router.get("/tasks", response_model=List[Task])
-async def get_tasks(current_user: dict = Depends(get_current_user)):
+async def get_tasks(current_user: dict = Depends(require_role("admin"))):
     """Get all tasks (admin only)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     tasks = await db.tasks.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
     for task in tasks:
         if isinstance(task.get('created_at'), str):
@@ -2058,11 +2231,8 @@ async def get_tasks(current_user: dict = Depends(get_current_user)):
     return tasks
 
 @api_router.get("/tasks/{task_id}", response_model=Task)
-async def get_task(task_id: str, current_user: dict = Depends(get_current_user)):
+async def get_task(task_id: str, current_user: dict = Depends(require_role("admin"))):
     """Get a specific task (admin only)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     task = await db.tasks.find_one({"id": task_id}, {"_id": 0})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -2077,12 +2247,9 @@ async def get_task(task_id: str, current_user: dict = Depends(get_current_user))
 async def update_task(
     task_id: str,
     task_data: TaskUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Update a task (admin only)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     update_data = {k: v for k, v in task_data.model_dump().items() if v is not None}
     
     # Update assigned_to_name and photo if assigned_to is being changed
@@ -2109,11 +2276,8 @@ async def update_task(
     return updated
 
 @api_router.patch("/tasks/{task_id}/toggle")
-async def toggle_task_status(task_id: str, current_user: dict = Depends(get_current_user)):
+async def toggle_task_status(task_id: str, current_user: dict = Depends(require_role("admin"))):
     """Toggle task status between TODO and DONE (admin only)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     task = await db.tasks.find_one({"id": task_id}, {"_id": 0})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -2132,11 +2296,8 @@ async def toggle_task_status(task_id: str, current_user: dict = Depends(get_curr
     return updated
 
 @api_router.delete("/tasks/{task_id}")
-async def delete_task(task_id: str, current_user: dict = Depends(get_current_user)):
+async def delete_task(task_id: str, current_user: dict = Depends(require_role("admin"))):
     """Delete a task (admin only)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     result = await db.tasks.delete_one({"id": task_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -2162,6 +2323,9 @@ async def create_news(news_data: NewsCreate, current_user: dict = Depends(get_cu
     await db.news.insert_one(doc)
     return news
 
+# Vues / impressions / clics cumulés en mémoire, écrits par une tâche de fond
+counter_buffer = CounterBuffer()
+
 @api_router.get("/news", response_model=List[News])
 async def get_news(
     status: Optional[str] = None,
@@ -2190,9 +2354,9 @@ async def get_news_item(news_id: str):
     if not news:
         raise HTTPException(status_code=404, detail="News not found")
     
-    # Increment views
-    await db.news.update_one({"id": news_id}, {"$inc": {"views": 1}})
-    news['views'] += 1
+    # Increment views (écriture différée, voir counter_buffer.py)
+    counter_buffer.incr("news", news_id, "views")
+    news['views'] = news.get('views', 0) + counter_buffer.pending("news", news_id, "views")
     
     if isinstance(news.get('created_at'), str):
         news['created_at'] = datetime.fromisoformat(news['created_at'])
@@ -2257,12 +2421,13 @@ async def add_news_comment(news_id: str, comment_data: NewsCommentCreate, curren
     if not news:
         raise HTTPException(status_code=404, detail="News not found")
     
+    author_photo = await get_user_photo(current_user["id"])
     comment = {
         "id": str(uuid.uuid4()),
         "news_id": news_id,
         "author_id": current_user["id"],
         "author_name": current_user.get("full_name", "Membre"),
-        "author_photo": current_user.get("photo_url"),
+        "author_photo": author_photo,
         "content": comment_data.content,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
@@ -2535,71 +2700,19 @@ async def unregister_from_event(event_id: str, current_user: dict = Depends(get_
 @api_router.get("/users/search")
 async def search_users(q: str = "", current_user: dict = Depends(get_current_user)):
     """Search users by name or email for starting conversations"""
-    if len(q) < 2:
+    if len(q.strip()) < 2:
         return []
     
-    # Search in users (admins), members, and technical directors
-    results = []
-    
-    # Search users - exclure les adresses système (academie-levinet, academielevinet)
-    users = await db.users.find({
-        "$and": [
-            {"id": {"$ne": current_user['id']}},
-            {"email": {"$not": {"$regex": "academie-?levinet", "$options": "i"}}},
-            {"$or": [
-                {"full_name": {"$regex": q, "$options": "i"}},
-                {"email": {"$regex": q, "$options": "i"}}
-            ]}
-        ]
-    }, {"_id": 0, "password_hash": 0}).to_list(10)
-    
-    for u in users:
-        results.append({
-            "id": u['id'],
-            "name": u['full_name'],
-            "email": u['email'],
-            "photo_url": u.get('photo_url'),
-            "type": "Admin"
-        })
-    
-    # Search members
-    members = await db.members.find({
-        "$or": [
-            {"first_name": {"$regex": q, "$options": "i"}},
-            {"last_name": {"$regex": q, "$options": "i"}},
-            {"email": {"$regex": q, "$options": "i"}}
-        ]
-    }, {"_id": 0}).to_list(10)
-    
-    for m in members:
-        if m['id'] != current_user['id']:
-            results.append({
-                "id": m['id'],
-                "name": f"{m['first_name']} {m['last_name']}",
-                "email": m['email'],
-                "photo_url": m.get('photo_url'),
-                "type": "Membre"
-            })
-    
-    # Search technical directors
-    directors = await db.technical_directors.find({
-        "$or": [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"email": {"$regex": q, "$options": "i"}}
-        ]
-    }, {"_id": 0}).to_list(10)
-    
-    for d in directors:
-        if d['id'] != current_user['id']:
-            results.append({
-                "id": d['id'],
-                "name": d['name'],
-                "email": d['email'],
-                "photo_url": d.get('photo_url'),
-                "type": "Directeur Technique"
-            })
-    
-    return results[:15]  # Limit total results
+    # Index en mémoire des users, members et technical directors (people_search.py)
+    await people_index.refresh(db, person_resolver)
+    return await person_resolver.with_photos(db, people_index.search(q, limit=15, exclude=[current_user['id']]))
+
+event_hub = EventHub(queue_size=EVENT_QUEUE_SIZE)
+message_digest = MessageDigestScheduler(
+    resolver=person_resolver,
+    window_seconds=MESSAGE_DIGEST_WINDOW_SECONDS,
+    is_online=lambda user_id: event_hub.is_connected(user_id) or presence_tracker.is_online(user_id)
+)
 
 @api_router.get("/conversations")
 async def get_conversations(current_user: dict = Depends(get_current_user)):
@@ -2609,7 +2722,29 @@ async def get_conversations(current_user: dict = Depends(get_current_user)):
         {"_id": 0}
     ).sort("updated_at", -1).to_list(100)
     
-    # Convert datetime strings and add unread count
+    # Resolve the other participant of each conversation
+    for conv in conversations:
+        other_participant_idx = 1 if conv['participants'][0] == current_user['id'] else 0
+        conv['other_participant_id'] = conv['participants'][other_participant_idx] if len(conv['participants']) > other_participant_idx else None
+        conv['other_participant_name'] = conv['participant_names'][other_participant_idx] if len(conv['participant_names']) > other_participant_idx else "Utilisateur"
+    
+    # Unread counts and participant photos: one batched query each
+    conversation_ids = [conv['id'] for conv in conversations]
+    other_ids = list({conv['other_participant_id'] for conv in conversations if conv['other_participant_id']})
+    unread_groups, other_photos = await asyncio.gather(
+        db.messages.aggregate([
+            {"$match": {
+                "conversation_id": {"$in": conversation_ids},
+                "read": False,
+                "sender_id": {"$ne": current_user['id']}
+            }},
+            {"$group": {"_id": "$conversation_id", "count": {"$sum": 1}}}
+        ]).to_list(None),
+        person_resolver.resolve_photos(db, other_ids)
+    )
+    unread_by_conversation = {group['_id']: group['count'] for group in unread_groups}
+    
+    # Convert datetime strings and attach unread count / photo
     for conv in conversations:
         if isinstance(conv.get('created_at'), str):
             conv['created_at'] = datetime.fromisoformat(conv['created_at'])
@@ -2618,26 +2753,8 @@ async def get_conversations(current_user: dict = Depends(get_current_user)):
         if conv.get('last_message_at') and isinstance(conv.get('last_message_at'), str):
             conv['last_message_at'] = datetime.fromisoformat(conv['last_message_at'])
         
-        # Get unread count for this conversation
-        unread_count = await db.messages.count_documents({
-            "conversation_id": conv['id'],
-            "sender_id": {"$ne": current_user['id']},
-            "read": False
-        })
-        conv['unread_count'] = unread_count
-        
-        # Get the other participant's info
-        other_participant_idx = 1 if conv['participants'][0] == current_user['id'] else 0
-        other_participant_id = conv['participants'][other_participant_idx] if len(conv['participants']) > other_participant_idx else None
-        conv['other_participant_name'] = conv['participant_names'][other_participant_idx] if len(conv['participant_names']) > other_participant_idx else "Utilisateur"
-        conv['other_participant_id'] = other_participant_id
-        
-        # Get other participant's photo
-        if other_participant_id:
-            other_user = await db.users.find_one({"id": other_participant_id}, {"_id": 0, "photo_url": 1})
-            conv['other_participant_photo'] = other_user.get('photo_url') if other_user else None
-        else:
-            conv['other_participant_photo'] = None
+        conv['unread_count'] = unread_by_conversation.get(conv['id'], 0)
+        conv['other_participant_photo'] = other_photos.get(conv['other_participant_id'])
     
     return conversations
 
@@ -2656,31 +2773,14 @@ async def create_conversation(data: ConversationCreate, current_user: dict = Dep
             existing['updated_at'] = datetime.fromisoformat(existing['updated_at'])
         return existing
     
-    # Get recipient name
-    recipient_name = "Utilisateur"
-    
-    # Check in users
-    recipient = await db.users.find_one({"id": data.recipient_id}, {"_id": 0})
-    if recipient:
-        recipient_name = recipient['full_name']
-    else:
-        # Check in members
-        recipient = await db.members.find_one({"id": data.recipient_id}, {"_id": 0})
-        if recipient:
-            recipient_name = f"{recipient['first_name']} {recipient['last_name']}"
-        else:
-            # Check in technical directors
-            recipient = await db.technical_directors.find_one({"id": data.recipient_id}, {"_id": 0})
-            if recipient:
-                recipient_name = recipient['name']
-    
+    recipient = await person_resolver.resolve(db, data.recipient_id)
     if not recipient:
         raise HTTPException(status_code=404, detail="Recipient not found")
     
     # Create conversation
     conversation = Conversation(
         participants=[current_user['id'], data.recipient_id],
-        participant_names=[current_user['full_name'], recipient_name]
+        participant_names=[current_user['full_name'], recipient['name']]
     )
     
     doc = conversation.model_dump()
@@ -2691,38 +2791,125 @@ async def create_conversation(data: ConversationCreate, current_user: dict = Dep
     
     return conversation
 
+# Réponse de /conversations/{id}/messages appelée sans limit ni curseur
+MESSAGES_FULL_HISTORY_LIMIT = 500
+
 @api_router.get("/conversations/{conversation_id}/messages")
-async def get_messages(conversation_id: str, current_user: dict = Depends(get_current_user)):
-    """Get messages for a conversation"""
+async def get_messages(
+    conversation_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    mark_read: bool = True,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a page of messages, oldest first within the page.
+
+    Without cursor: the newest `limit` messages (default 50), or the whole
+    history (up to 500 messages) when no limit is given either, as older
+    clients expect. `before` loads the older page (cursor in
+    X-Before-Cursor), `after` only the messages newer than the cursor
+    (X-After-Cursor), for polling.
+    """
     # Verify user is participant
     conversation = await db.conversations.find_one({
         "id": conversation_id,
         "participants": current_user['id']
-    }, {"_id": 0})
+    }, {"_id": 0, "id": 1})
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    if before and after:
+        raise HTTPException(status_code=400, detail="Utiliser before ou after, pas les deux")
     
-    messages = await db.messages.find(
-        {"conversation_id": conversation_id},
-        {"_id": 0}
-    ).sort("created_at", 1).to_list(500)
+    if limit is None and not before and not after:
+        # Clients sans pagination: tout l'historique, comme avant
+        limit = MESSAGES_FULL_HISTORY_LIMIT
+    else:
+        limit = max(1, min(limit or 50, 200))
+    query = {"conversation_id": conversation_id}
+    try:
+        if after:
+            created_at, message_id = decode_cursor(after, 2)
+            query.update(keyset_filter("created_at", created_at, message_id, descending=False))
+        elif before:
+            created_at, message_id = decode_cursor(before, 2)
+            query.update(keyset_filter("created_at", created_at, message_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    
+    if after:
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("created_at", 1), ("id", 1)]
+        ).limit(limit).to_list(limit)
+    else:
+        # Page la plus récente d'abord, remise dans l'ordre chronologique
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("created_at", -1), ("id", -1)]
+        ).limit(limit).to_list(limit)
+        messages.reverse()
+    
+    if messages:
+        if not after and len(messages) == limit:
+            response.headers["X-Before-Cursor"] = encode_cursor(messages[0].get("created_at"), messages[0].get("id"))
+        response.headers["X-After-Cursor"] = encode_cursor(messages[-1].get("created_at"), messages[-1].get("id"))
+    elif after:
+        response.headers["X-After-Cursor"] = after
+    
+    # Ouvrir la conversation marque comme lu jusqu'au dernier message affiché
+    if mark_read and not before and messages:
+        await mark_conversation_read(conversation_id, current_user['id'], messages[-1].get("created_at"))
+    
+    return messages
+
+@api_router.post("/conversations/{conversation_id}/read")
+async def mark_conversation_read_endpoint(
+    conversation_id: str,
+    data: Optional[ConversationReadRequest] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Move the user's read watermark forward"""
+    conversation = await db.conversations.find_one({
+        "id": conversation_id,
+        "participants": current_user['id']
+    }, {"_id": 0, "id": 1})
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
     
-    # Mark messages as read
+    up_to = (data.up_to if data else None) or datetime.now(timezone.utc).isoformat()
+    unread_count = await mark_conversation_read(conversation_id, current_user['id'], up_to)
+    return {"conversation_id": conversation_id, "read_up_to": up_to, "unread_count": unread_count}
+
+async def mark_conversation_read(conversation_id: str, user_id: str, up_to: str) -> int:
+    """Mark messages up to `up_to` as read and store the watermark.
+
+    No write at all when nothing is unread, which keeps polling cheap.
+    Returns the messages still unread after the watermark.
+    """
+    unread_query = {
+        "conversation_id": conversation_id,
+        "sender_id": {"$ne": user_id},
+        "read": False
+    }
+    unread = await get_conversation_unread(db, user_id, conversation_id)
+    # Un compteur initialisé pendant un envoi peut être en retard sur les
+    # drapeaux read: à 0, vérifier qu'aucun message n'est encore marqué non lu
+    if unread == 0 and not await db.messages.find_one(unread_query, {"_id": 0, "id": 1}):
+        return 0
     await db.messages.update_many(
-        {
-            "conversation_id": conversation_id,
-            "sender_id": {"$ne": current_user['id']},
-            "read": False
-        },
+        {**unread_query, "created_at": {"$lte": up_to}},
         {"$set": {"read": True}}
     )
-    
-    for msg in messages:
-        if isinstance(msg.get('created_at'), str):
-            msg['created_at'] = datetime.fromisoformat(msg['created_at'])
-    
-    return messages
+    await db.conversations.update_one(
+        {"id": conversation_id},
+        {"$max": {f"read_up_to.{user_id}": up_to}}
+    )
+    remaining = await db.messages.count_documents(unread_query)
+    await reset_unread(db, user_id, conversation_id, remaining)
+    if event_hub.has_listeners(user_id):
+        await event_hub.publish(user_id, "unread.count", {"unread_count": await get_unread_total(db, user_id)})
+    return remaining
 
 @api_router.post("/conversations/{conversation_id}/messages")
 async def send_message(conversation_id: str, data: MessageCreate, current_user: dict = Depends(get_current_user)):
@@ -2765,48 +2952,69 @@ async def send_message(conversation_id: str, data: MessageCreate, current_user:
             }
         }
     )
+    recipient_ids = [p for p in conversation['participants'] if p != current_user['id']]
+    await increment_unread(db, recipient_ids, conversation_id)
     
-    # Send email notification to recipient (non-blocking)
-    other_participant_id = conversation['participants'][1] if conversation['participants'][0] == current_user['id'] else conversation['participants'][0]
+    # Push temps réel: le message à tous les participants, le badge aux destinataires
+    message_event = {"conversation_id": conversation_id, "message": message.model_dump(mode="json")}
+    for participant_id in conversation['participants']:
+        await event_hub.publish(participant_id, "message.new", message_event)
+    for recipient_id in recipient_ids:
+        if event_hub.has_listeners(recipient_id):
+            await event_hub.publish(recipient_id, "unread.count", {"unread_count": await get_unread_total(db, recipient_id)})
     
-    # Find recipient email
-    recipient = await db.users.find_one({"id": other_participant_id}, {"_id": 0})
-    if not recipient:
-        recipient = await db.members.find_one({"id": other_participant_id}, {"_id": 0})
-    if not recipient:
-        recipient = await db.technical_directors.find_one({"id": other_participant_id}, {"_id": 0})
-    
-    if recipient and recipient.get('email'):
-        recipient_name = recipient.get('full_name') or recipient.get('name') or f"{recipient.get('first_name', '')} {recipient.get('last_name', '')}".strip()
-        asyncio.create_task(send_email(
-            to_email=recipient['email'],
-            subject=f"Nouveau message de {current_user['full_name']}",
-            html_content=get_new_message_notification_html(
-                recipient_name=recipient_name,
-                sender_name=current_user['full_name'],
-                message_preview=data.content[:200]
-            ),
-            text_content=f"Vous avez reçu un nouveau message de {current_user['full_name']}: {data.content[:200]}"
-        ))
+    # Notification email regroupée (voir message_digest.py)
+    for recipient_id in recipient_ids:
+        message_digest.schedule(recipient_id, message.id, current_user['full_name'], data.content)
     
     return message
 
+@api_router.get("/realtime/stream")
+async def stream_events(request: Request, token: Optional[str] = None):
+    """Server-Sent Events stream of the current user's real-time events.
+
+    EventSource cannot set headers, so the JWT may be passed as the `token`
+    query parameter instead of the Authorization header.
+    """
+    if not token:
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user_id = (await verify_token(token))["user_id"]
+    
+    queue = event_hub.subscribe(user_id)
+    
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event.get('data', {}), default=str)}\n\n"
+        finally:
+            event_hub.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            # Empêche GZipMiddleware de bufferiser le flux
+            "Content-Encoding": "identity"
+        }
+    )
+
 @api_router.get("/conversations/unread-count")
 async def get_unread_count(current_user: dict = Depends(get_current_user)):
     """Get total unread message count for the current user"""
-    # Get all conversation IDs for this user
-    conversations = await db.conversations.find(
-        {"participants": current_user['id']},
-        {"id": 1}
-    ).to_list(1000)
-    
-    conversation_ids = [c['id'] for c in conversations]
-    
-    unread_count = await db.messages.count_documents({
-        "conversation_id": {"$in": conversation_ids},
-        "sender_id": {"$ne": current_user['id']},
-        "read": False
-    })
+    # Compteur maintenu par send_message / get_messages (voir unread_counters.py)
+    unread_count = await get_unread_total(db, current_user['id'])
     
     return {"unread_count": unread_count}
 
@@ -2815,12 +3023,9 @@ async def get_unread_count(current_user: dict = Depends(get_current_user)):
 async def admin_get_all_messages(
     limit: int = 100,
     skip: int = 0,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Get all messages for moderation"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     messages = await db.messages.find({}, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
     
     for msg in messages:
@@ -2832,27 +3037,36 @@ async def admin_get_all_messages(
     return {"messages": messages, "total": total}
 
 @api_router.delete("/admin/messages/{message_id}")
-async def admin_delete_message(message_id: str, current_user: dict = Depends(get_current_user)):
+async def admin_delete_message(message_id: str, current_user: dict = Depends(require_role("admin"))):
     """Admin: Delete a message (moderation)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
-    result = await db.messages.delete_one({"id": message_id})
-    if result.deleted_count == 0:
+    message = await db.messages.find_one_and_delete(
+        {"id": message_id},
+        {"_id": 0, "conversation_id": 1, "sender_id": 1, "read": 1}
+    )
+    if message is None:
         raise HTTPException(status_code=404, detail="Message not found")
     
+    # Message encore non lu: le retirer du compteur des destinataires
+    if message.get("read") is False:
+        conversation = await db.conversations.find_one(
+            {"id": message.get("conversation_id")},
+            {"_id": 0, "participants": 1}
+        )
+        recipients = [uid for uid in (conversation or {}).get("participants", []) if uid != message.get("sender_id")]
+        await decrement_unread(db, recipients, message["conversation_id"])
+        for user_id in recipients:
+            if event_hub.has_listeners(user_id):
+                await event_hub.publish(user_id, "unread.count", {"unread_count": await get_unread_total(db, user_id)})
+    
     return {"message": "Message deleted successfully"}
 
 @api_router.get("/admin/conversations")
 async def admin_get_all_conversations(
     limit: int = 50,
     skip: int = 0,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Get all conversations for moderation"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     conversations = await db.conversations.find({}, {"_id": 0}).sort("updated_at", -1).skip(skip).limit(limit).to_list(limit)
     
     for conv in conversations:
@@ -2886,19 +3100,42 @@ class CommentCreate(BaseModel):
 class ReactionCreate(BaseModel):
     reaction_type: str = "like"
 
-@api_router.get("/wall/posts")
-async def get_wall_posts(
-    limit: int = 20,
-    skip: int = 0,
-    current_user: dict = Depends(get_current_user)
-):
-    """Get all posts for the community wall"""
-    posts = await db.posts.find({}, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+# Carte auteur jointe aux posts du mur (même forme que la réponse de create_post)
+AUTHOR_CARD_PROJECTION = {"_id": 0, "id": 1, "full_name": 1, "email": 1, "role": 1, "photo_url": 1}
+
+presence_tracker = PresenceTracker(
+    window_seconds=PRESENCE_WINDOW_SECONDS,
+    max_profiles=PRINCIPAL_CACHE_MAX_ENTRIES,
+    profile_projection=AUTHOR_CARD_PROJECTION
+)
+
+async def enrich_wall_posts(posts: List[dict], viewer_id: Optional[str]) -> List[dict]:
+    """Attach author, engagement counters and the viewer's reaction to a page of posts.
+
+    Counters are read from the post document (see post_counters.py); only
+    posts created before the counters existed are recomputed on the fly.
+    """
+    if not posts:
+        return posts
+    
+    post_ids = [post["id"] for post in posts]
+    author_ids = list({post.get("author_id") for post in posts if post.get("author_id")})
+    legacy_ids = [post["id"] for post in posts if "comments_count" not in post or "reactions" not in post]
+    
+    authors, own_reactions, legacy_counters = await asyncio.gather(
+        db.users.find({"id": {"$in": author_ids}}, AUTHOR_CARD_PROJECTION).to_list(len(author_ids)),
+        db.post_reactions.find(
+            {"post_id": {"$in": post_ids}, "user_id": viewer_id},
+            {"_id": 0, "post_id": 1, "reaction_type": 1}
+        ).to_list(len(post_ids)),
+        compute_post_counters(db, legacy_ids) if legacy_ids else asyncio.sleep(0, result={})
+    )
+    
+    authors_by_id = {author["id"]: author for author in authors}
+    user_reaction_by_post = {r["post_id"]: r.get("reaction_type", "like") for r in own_reactions}
     
-    # Enrich posts with author info, comments count, reactions
     for post in posts:
-        # Get author info
-        author = await db.users.find_one({"id": post.get("author_id")}, {"_id": 0, "password_hash": 0})
+        author = authors_by_id.get(post.get("author_id"))
         if author:
             post["author"] = author
         else:
@@ -2908,26 +3145,48 @@ async def get_wall_posts(
                 "full_name": post.get("author_name", "Membre"),
                 "photo_url": post.get("author_photo")
             }
-        
-        # Get comments count
-        comments_count = await db.post_comments.count_documents({"post_id": post["id"]})
-        post["comments_count"] = comments_count
-        
-        # Get reactions summary
-        reactions = await db.post_reactions.find({"post_id": post["id"]}, {"_id": 0}).to_list(100)
-        reaction_summary = {}
-        user_reaction = None
-        for r in reactions:
-            rt = r.get("reaction_type", "like")
-            reaction_summary[rt] = reaction_summary.get(rt, 0) + 1
-            if r.get("user_id") == current_user.get("id"):
-                user_reaction = rt
-        post["reactions"] = reaction_summary
-        post["reactions_count"] = len(reactions)
-        post["user_reaction"] = user_reaction
-    
-    total = await db.posts.count_documents({})
-    return {"posts": posts, "total": total}
+        post.update(legacy_counters.get(post["id"], {}))
+        # Un retrait de réaction laisse le type à 0 dans la map
+        post["reactions"] = {k: v for k, v in (post.get("reactions") or {}).items() if v > 0}
+        post["reactions_count"] = max(post.get("reactions_count", 0), 0)
+        post["comments_count"] = max(post.get("comments_count", 0), 0)
+        post["user_reaction"] = user_reaction_by_post.get(post["id"])
+    
+    return posts
+
+@api_router.get("/wall/posts")
+async def get_wall_posts(
+    limit: int = 20,
+    skip: int = 0,
+    before: Optional[str] = None,
+    include_total: bool = True,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get posts for the community wall, newest first.
+
+    Pass the `next_cursor` of a page as `before` to get the following one;
+    `skip` is kept for older clients.
+    """
+    limit = max(1, min(limit, 100))
+    query = {}
+    if before:
+        try:
+            created_at, post_id = decode_cursor(before, 2)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+        query = keyset_filter("created_at", created_at, post_id)
+        skip = 0
+    
+    posts = await db.posts.find(query, {"_id": 0}).sort([("created_at", -1), ("id", -1)]).skip(skip).limit(limit).to_list(limit)
+    cursor = next_cursor(posts, limit, "created_at")
+    
+    await enrich_wall_posts(posts, current_user.get("id"))
+    
+    response = {"posts": posts, "next_cursor": cursor}
+    if include_total:
+        # Estimation depuis les métadonnées de la collection (pas de scan)
+        response["total"] = await db.posts.estimated_document_count()
+    return response
 
 @api_router.post("/wall/posts")
 async def create_post(
@@ -2935,15 +3194,19 @@ async def create_post(
     current_user: dict = Depends(get_current_user)
 ):
     """Create a new post on the community wall"""
+    author_photo = await get_user_photo(current_user.get("id"))
     post = {
         "id": str(uuid.uuid4()),
         "author_id": current_user.get("id"),
         "author_name": current_user.get("full_name", "Membre"),
-        "author_photo": current_user.get("photo_url"),
+        "author_photo": author_photo,
         "content": post_data.content,
         "post_type": post_data.post_type,
         "image_url": post_data.image_url,
         "video_url": post_data.video_url,
+        "comments_count": 0,
+        "reactions_count": 0,
+        "reactions": {},
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
@@ -2966,11 +3229,8 @@ async def create_post(
         "full_name": current_user.get("full_name"),
         "email": current_user.get("email"),
         "role": current_user.get("role"),
-        "photo_url": current_user.get("photo_url")
+        "photo_url": author_photo
     }
-    post["comments_count"] = 0
-    post["reactions"] = {}
-    post["reactions_count"] = 0
     post["user_reaction"] = None
     
     return post
@@ -3029,16 +3289,18 @@ async def create_comment(
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
+    author_photo = await get_user_photo(current_user.get("id"))
     comment = {
         "id": str(uuid.uuid4()),
         "post_id": post_id,
         "author_id": current_user.get("id"),
         "author_name": current_user.get("full_name", "Membre"),
-        "author_photo": current_user.get("photo_url"),
+        "author_photo": author_photo,
         "content": comment_data.content,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.post_comments.insert_one(comment)
+    await db.posts.update_one({"id": post_id}, {"$inc": {"comments_count": 1}})
     
     # 🎯 Award tokens for commenting
     await award_tokens(
@@ -3055,7 +3317,7 @@ async def create_comment(
         "id": current_user.get("id"),
         "full_name": current_user.get("full_name"),
         "email": current_user.get("email"),
-        "photo_url": current_user.get("photo_url")
+        "photo_url": author_photo
     }
     
     return comment
@@ -3074,7 +3336,9 @@ async def delete_comment(
     if comment.get("author_id") != current_user.get("id") and current_user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this comment")
     
-    await db.post_comments.delete_one({"id": comment_id})
+    result = await db.post_comments.delete_one({"id": comment_id})
+    if result.deleted_count:
+        await db.posts.update_one({"id": post_id}, {"$inc": {"comments_count": -1}})
     return {"message": "Comment deleted successfully"}
 
 @api_router.post("/wall/posts/{post_id}/reactions")
@@ -3084,7 +3348,11 @@ async def toggle_reaction(
     current_user: dict = Depends(get_current_user)
 ):
     """Toggle a reaction on a post"""
-    post = await db.posts.find_one({"id": post_id})
+    # Le type sert de clé dans posts.reactions: seules les valeurs connues sont acceptées
+    if reaction_data.reaction_type not in [r.value for r in ReactionType]:
+        raise HTTPException(status_code=400, detail="Type de réaction invalide")
+    
+    post = await db.posts.find_one({"id": post_id}, {"_id": 0, "id": 1, "author_id": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
@@ -3094,16 +3362,27 @@ async def toggle_reaction(
     })
     
     if existing:
-        if existing.get("reaction_type") == reaction_data.reaction_type:
+        previous_type = existing.get("reaction_type", "like")
+        if previous_type == reaction_data.reaction_type:
             # Remove reaction
-            await db.post_reactions.delete_one({"id": existing["id"]})
+            result = await db.post_reactions.delete_one({"id": existing["id"]})
+            if result.deleted_count:
+                await db.posts.update_one(
+                    {"id": post_id},
+                    {"$inc": {"reactions_count": -1, f"reactions.{previous_type}": -1}}
+                )
             return {"action": "removed", "reaction_type": None}
         else:
             # Update reaction
-            await db.post_reactions.update_one(
-                {"id": existing["id"]},
+            result = await db.post_reactions.update_one(
+                {"id": existing["id"], "reaction_type": existing.get("reaction_type")},
                 {"$set": {"reaction_type": reaction_data.reaction_type}}
             )
+            if result.modified_count:
+                await db.posts.update_one(
+                    {"id": post_id},
+                    {"$inc": {f"reactions.{previous_type}": -1, f"reactions.{reaction_data.reaction_type}": 1}}
+                )
             return {"action": "updated", "reaction_type": reaction_data.reaction_type}
     else:
         # Add reaction
@@ -3114,7 +3393,19 @@ async def toggle_reaction(
             "reaction_type": reaction_data.reaction_type,
             "created_at": datetime.now(timezone.utc).isoformat()
         }
-        await db.post_reactions.insert_one(reaction)
+        try:
+            await db.post_reactions.insert_one(reaction)
+        except DuplicateKeyError:
+            # Requête concurrente (double clic): la réaction existe déjà, compteurs inclus
+            current = await db.post_reactions.find_one(
+                {"post_id": post_id, "user_id": current_user.get("id")},
+                {"_id": 0, "reaction_type": 1}
+            )
+            return {"action": "added", "reaction_type": (current or {}).get("reaction_type", reaction_data.reaction_type)}
+        await db.posts.update_one(
+            {"id": post_id},
+            {"$inc": {"reactions_count": 1, f"reactions.{reaction_data.reaction_type}": 1}}
+        )
         
         # 🎯 Award tokens to post author for receiving a reaction
         if post.get("author_id") and post.get("author_id") != current_user.get("id"):
@@ -3130,55 +3421,27 @@ async def toggle_reaction(
 @api_router.get("/wall/online-users")
 async def get_online_users(current_user: dict = Depends(get_current_user)):
     """Get recently active users (active in last 15 minutes)"""
-    # Update current user's last activity
-    await db.user_activity.update_one(
-        {"user_id": current_user.get("id")},
-        {"$set": {
-            "user_id": current_user.get("id"),
-            "last_active": datetime.now(timezone.utc).isoformat()
-        }},
-        upsert=True
-    )
+    # Activité gardée en mémoire, écrite en base par la tâche "presence"
+    presence_tracker.touch(current_user.get("id"))
     
-    # Get users active in last 15 minutes
-    threshold = (datetime.now(timezone.utc) - timedelta(minutes=15)).isoformat()
-    active_records = await db.user_activity.find(
-        {"last_active": {"$gte": threshold}},
-        {"_id": 0}
-    ).to_list(100)
-    
-    online_users = []
-    for record in active_records:
-        user = await db.users.find_one(
-            {"id": record.get("user_id")},
-            {"_id": 0, "password_hash": 0}
-        )
-        if user:
-            online_users.append(user)
+    online_users = await presence_tracker.online_profiles(db, limit=100)
     
     return {"online_users": online_users, "count": len(online_users)}
 
 @api_router.get("/wall/stats")
 async def get_wall_stats(current_user: dict = Depends(get_current_user)):
     """Get community statistics"""
-    total_members = await db.users.count_documents({})
-    total_posts = await db.posts.count_documents({})
-    total_comments = await db.post_comments.count_documents({})
-    
-    # Posts this week
     week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    posts_this_week = await db.posts.count_documents({"created_at": {"$gte": week_ago}})
-    
-    # Get recent achievements/milestones
-    recent_members = await db.users.find({}, {"_id": 0, "password_hash": 0}).sort("created_at", -1).limit(5).to_list(5)
     
-    return {
-        "total_members": total_members,
-        "total_posts": total_posts,
-        "total_comments": total_comments,
-        "posts_this_week": posts_this_week,
-        "recent_members": recent_members
-    }
+    # Lectures indépendantes, lancées en parallèle
+    return await run_queries({
+        "total_members": lambda: db.users.count_documents({}),
+        "total_posts": lambda: db.posts.count_documents({}),
+        "total_comments": lambda: db.post_comments.count_documents({}),
+        "posts_this_week": lambda: db.posts.count_documents({"created_at": {"$gte": week_ago}}),
+        # Get recent achievements/milestones
+        "recent_members": lambda: db.users.find({}, {"_id": 0, "password_hash": 0}).sort("created_at", -1).limit(5).to_list(5),
+    })
 
 # ==================== PARTNERS & SPONSORS ENDPOINTS ====================
 
@@ -3333,10 +3596,7 @@ async def track_affiliate_click(code: str):
     """Track a click from an affiliate link (public endpoint)"""
     affiliate = await db.affiliates.find_one({"code": code, "status": "active"})
     if affiliate:
-        await db.affiliates.update_one(
-            {"id": affiliate["id"]},
-            {"$inc": {"clicks": 1}}
-        )
+        counter_buffer.incr("affiliates", affiliate["id"], "clicks")
         return {"success": True}
     return {"success": False}
 
@@ -3390,37 +3650,42 @@ class ForumMessageCreate(BaseModel):
     content: str
     topic_id: str
 
+# Statistiques du widget forum, partagées par tous les visiteurs
+forum_stats_cache = TTLCache(FORUM_STATS_CACHE_TTL_SECONDS, 1)
+
 @api_router.get("/forums/stats")
 async def get_forums_stats(current_user: dict = Depends(get_current_user)):
     """Get forum statistics"""
-    total_forums = await db.forums.count_documents({})
-    total_topics = await db.forum_topics.count_documents({})
-    total_messages = await db.forum_messages.count_documents({})
+    stats = forum_stats_cache.get("stats")
+    if stats is not None:
+        return stats
     
-    # Get unique authors from messages (last 30 days)
+    # Unique authors from messages (last 30 days), counted inside Mongo
     thirty_days_ago = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
-    recent_messages = await db.forum_messages.find(
-        {"created_at": {"$gte": thirty_days_ago}},
-        {"author_id": 1}
-    ).to_list(10000)
-    active_users = len(set(msg.get("author_id") for msg in recent_messages if msg.get("author_id")))
+    results = await run_queries({
+        "totalForums": lambda: db.forums.estimated_document_count(),
+        "totalTopics": lambda: db.forum_topics.estimated_document_count(),
+        "totalMessages": lambda: db.forum_messages.estimated_document_count(),
+        "activeUsers": lambda: db.forum_messages.aggregate([
+            {"$match": {"created_at": {"$gte": thirty_days_ago}, "author_id": {"$nin": [None, ""]}}},
+            {"$group": {"_id": "$author_id"}},
+            {"$count": "count"}
+        ]).to_list(1),
+    })
     
-    return {
-        "totalForums": total_forums,
-        "totalTopics": total_topics,
-        "totalMessages": total_messages,
-        "activeUsers": active_users
-    }
+    active_authors = results.pop("activeUsers")
+    stats = {**results, "activeUsers": active_authors[0]["count"] if active_authors else 0}
+    forum_stats_cache.set("stats", stats)
+    return stats
 
 @api_router.get("/forums")
 async def get_forums(current_user: dict = Depends(get_current_user)):
     """Get all forums"""
+    # topic_count / message_count sont maintenus à l'écriture (voir forum_counters.py)
     forums = await db.forums.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    # Add topic and message counts
     for forum in forums:
-        forum["topic_count"] = await db.forum_topics.count_documents({"forum_id": forum["id"]})
-        forum["message_count"] = await db.forum_messages.count_documents({"forum_id": forum["id"]})
+        forum.setdefault("topic_count", 0)
+        forum.setdefault("message_count", 0)
     
     return forums
 
@@ -3454,6 +3719,7 @@ async def update_forum(forum_id: str, data: ForumUpdate, current_user: dict = De
 @api_router.delete("/forums/{forum_id}")
 async def delete_forum(forum_id: str, current_user: dict = Depends(get_current_user)):
     """Delete a forum and all its topics and messages"""
+    # Les compteurs disparaissent avec le forum: rien à décrémenter
     # Delete all messages in topics of this forum
     await db.forum_messages.delete_many({"forum_id": forum_id})
     # Delete all topics
@@ -3470,9 +3736,8 @@ async def get_forum_topics(forum_id: str, current_user: dict = Depends(get_curre
         {"_id": 0}
     ).sort([("is_pinned", -1), ("created_at", -1)]).to_list(1000)
     
-    # Add message counts and view counts
     for topic in topics:
-        topic["message_count"] = await db.forum_messages.count_documents({"topic_id": topic["id"]})
+        topic.setdefault("message_count", 0)
         if "view_count" not in topic:
             topic["view_count"] = 0
     
@@ -3482,6 +3747,7 @@ async def get_forum_topics(forum_id: str, current_user: dict = Depends(get_curre
 async def create_topic(forum_id: str, data: TopicCreate, current_user: dict = Depends(get_current_user)):
     """Create a new topic in a forum"""
     try:
+        author_photo = await get_user_photo(current_user.get("id", ""))
         topic = {
             "id": str(uuid.uuid4()),
             "forum_id": forum_id,
@@ -3489,7 +3755,7 @@ async def create_topic(forum_id: str, data: TopicCreate, current_user: dict = De
             "description": data.description or "",
             "author_id": current_user.get("id", ""),
             "author_name": current_user.get("full_name") or current_user.get("name") or "Utilisateur",
-            "author_photo": current_user.get("photo_url"),
+            "author_photo": author_photo,
             "is_pinned": data.is_pinned if data.is_pinned is not None else False,
             "is_locked": data.is_locked if data.is_locked is not None else False,
             "view_count": 0,
@@ -3498,6 +3764,7 @@ async def create_topic(forum_id: str, data: TopicCreate, current_user: dict = De
             "last_activity": datetime.now(timezone.utc).isoformat()
         }
         await db.forum_topics.insert_one(topic)
+        await db.forums.update_one({"id": forum_id}, {"$inc": {"topic_count": 1}})
         return topic
     except Exception as e:
         logger.error(f"Error creating topic: {e}")
@@ -3518,26 +3785,74 @@ async def delete_topic(topic_id: str, current_user: dict = Depends(get_current_u
     topic = await db.forum_topics.find_one({"id": topic_id})
     if topic:
         # Delete all messages in this topic
-        await db.forum_messages.delete_many({"topic_id": topic_id})
+        deleted_messages = await db.forum_messages.delete_many({"topic_id": topic_id})
         # Delete topic
-        await db.forum_topics.delete_one({"id": topic_id})
+        deleted_topic = await db.forum_topics.delete_one({"id": topic_id})
+        if deleted_topic.deleted_count and topic.get("forum_id"):
+            await db.forums.update_one(
+                {"id": topic["forum_id"]},
+                {"$inc": {"topic_count": -1, "message_count": -deleted_messages.deleted_count}}
+            )
     return {"message": "Sujet supprimé"}
 
 @api_router.get("/forums/topics/{topic_id}/messages")
-async def get_topic_messages(topic_id: str, current_user: dict = Depends(get_current_user)):
-    """Get all messages in a topic"""
-    # Increment view count
-    await db.forum_topics.update_one(
-        {"id": topic_id},
-        {"$inc": {"view_count": 1}}
-    )
+async def get_topic_messages(
+    topic_id: str,
+    page: int = 1,
+    limit: int = 50,
+    after: Optional[str] = None,
+    last: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a page of messages in a topic, oldest first.
+
+    `page` numbers pages from 1, `after` continues from a next_cursor, and
+    `last=true` jumps to the last page. The total comes from the topic's
+    message_count counter.
+    """
+    topic = await db.forum_topics.find_one({"id": topic_id}, {"_id": 0, "id": 1, "message_count": 1})
+    if not topic:
+        raise HTTPException(status_code=404, detail="Sujet introuvable")
     
-    messages = await db.forum_messages.find(
-        {"topic_id": topic_id},
-        {"_id": 0}
-    ).sort("created_at", 1).to_list(10000)
+    # Increment view count
+    counter_buffer.incr("forum_topics", topic_id, "view_count")
+    
+    limit = max(1, min(limit, 200))
+    total = topic.get("message_count", 0)
+    pages = max(1, -(-total // limit))
+    query = {"topic_id": topic_id}
+    
+    if last:
+        # Dernière page lue à l'envers depuis la fin: pas de skip sur tout le fil
+        page = pages
+        last_page_size = total - (pages - 1) * limit or limit
+        messages = await db.forum_messages.find(query, {"_id": 0}).sort(
+            [("created_at", -1), ("id", -1)]
+        ).limit(last_page_size).to_list(last_page_size)
+        messages.reverse()
+    else:
+        skip = 0
+        if after:
+            try:
+                created_at, message_id = decode_cursor(after, 2)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Curseur invalide")
+            query.update(keyset_filter("created_at", created_at, message_id, descending=False))
+        else:
+            page = max(1, page)
+            skip = (page - 1) * limit
+        messages = await db.forum_messages.find(query, {"_id": 0}).sort(
+            [("created_at", 1), ("id", 1)]
+        ).skip(skip).limit(limit).to_list(limit)
     
-    return messages
+    return {
+        "messages": messages,
+        "total": total,
+        "page": None if after else page,
+        "pages": pages,
+        "limit": limit,
+        "next_cursor": next_cursor(messages, limit, "created_at"),
+    }
 
 @api_router.post("/forums/topics/{topic_id}/messages")
 async def create_message(topic_id: str, data: ForumMessageCreate, current_user: dict = Depends(get_current_user)):
@@ -3547,6 +3862,7 @@ async def create_message(topic_id: str, data: ForumMessageCreate, current_user:
     if topic and topic.get("is_locked"):
         raise HTTPException(status_code=403, detail="Ce sujet est verrouillé")
     
+    author_photo = await get_user_photo(current_user["id"])
     message = {
         "id": str(uuid.uuid4()),
         "topic_id": topic_id,
@@ -3554,20 +3870,68 @@ async def create_message(topic_id: str, data: ForumMessageCreate, current_user:
         "content": data.content,
         "author_id": current_user["id"],
         "author_name": current_user.get("full_name", "Utilisateur"),
-        "author_photo": current_user.get("photo_url"),
+        "author_photo": author_photo,
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     await db.forum_messages.insert_one(message)
     
-    # Update topic last activity
+    # Update topic last activity and counters
     await db.forum_topics.update_one(
         {"id": topic_id},
-        {"$set": {"last_activity": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"last_activity": datetime.now(timezone.utc).isoformat()}, "$inc": {"message_count": 1}}
     )
+    if message["forum_id"]:
+        await db.forums.update_one({"id": message["forum_id"]}, {"$inc": {"message_count": 1}})
     
     return message
 
+# ==================== RECHERCHE DE CONTENUS ====================
+
+@api_router.get("/search")
+async def search(
+    q: str = "",
+    type: Optional[str] = None,
+    page: int = 1,
+    limit: int = 20,
+    current_user: dict = Depends(get_current_user)
+):
+    """Full-text search across news, wall posts, forum topics/messages and events.
+
+    `type` restricts the search to a comma-separated list of content types.
+    """
+    q = q.strip()
+    page = max(1, page)
+    limit = max(1, min(limit, 50))
+    types = [t.strip() for t in type.split(",") if t.strip()] if type else list(CONTENT_TYPES)
+    unknown = [t for t in types if t not in CONTENT_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Type de contenu inconnu: {', '.join(unknown)}")
+    if page * limit > MAX_SEARCH_WINDOW:
+        raise HTTPException(status_code=400, detail="Page trop lointaine, affinez la recherche")
+    if len(q) < 2:
+        return {"results": [], "total": 0, "facets": {t: 0 for t in types}, "page": page, "limit": limit}
+    
+    is_admin = current_user.get("role") == "admin"
+    forum_filter = {}
+    if not is_admin and ("topic" in types or "forum_message" in types):
+        # Forums privés dont l'utilisateur n'est pas participant
+        hidden_forums = await db.forums.find(
+            {"is_private": True, "participants": {"$ne": current_user['id']}},
+            {"_id": 0, "id": 1}
+        ).to_list(None)
+        if hidden_forums:
+            forum_filter = {"forum_id": {"$nin": [forum["id"] for forum in hidden_forums]}}
+    
+    visibility = {
+        "news": {} if is_admin else {"status": NewsStatus.PUBLISHED.value},
+        "post": {},
+        "topic": forum_filter,
+        "forum_message": forum_filter,
+        "event": {},
+    }
+    return await search_content(db, q, {t: visibility[t] for t in types}, page=page, limit=limit)
+
 # ==================== E-COMMERCE ENDPOINTS ====================
 
 class ProductCreate(BaseModel):
@@ -3616,12 +3980,9 @@ async def get_product(product_id: str):
 @api_router.post("/admin/products")
 async def create_product(
     product_data: ProductCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Create a new product"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     product = {
         "id": str(uuid.uuid4()),
         "name": product_data.name,
@@ -3643,12 +4004,9 @@ async def create_product(
 async def update_product(
     product_id: str,
     product_data: ProductUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Update a product"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     product = await db.products.find_one({"id": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -3664,12 +4022,9 @@ async def update_product(
 @api_router.delete("/admin/products/{product_id}")
 async def delete_product(
     product_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Delete a product"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -3678,24 +4033,18 @@ async def delete_product(
 
 @api_router.get("/admin/products")
 async def admin_get_products(
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Get all products including inactive ones"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     products = await db.products.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
     return {"products": products}
 
 @api_router.get("/admin/orders")
 async def admin_get_orders(
     status: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Get all orders"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     query = {}
     if status:
         query["status"] = status
@@ -3703,16 +4052,48 @@ async def admin_get_orders(
     orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
     return {"orders": orders}
 
+@api_router.get("/admin/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    request: Request,
+    format: str = "csv",
+    columns: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: dict = Depends(require_role("admin"))
+):
+    """
+    Admin: Stream a full dataset as CSV or NDJSON.
+
+    Jeux de données: members | orders | leads | token_ledger (voir data_export.py).
+    `columns` (liste séparée par des virgules) choisit les colonnes et leur
+    ordre; `since` / `until` bornent created_at (ISO 8601). Les filtres propres
+    au jeu de données se passent en paramètres (ex. ?status=En attente).
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail="Jeu de données inconnu")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format invalide (csv ou ndjson)")
+    try:
+        selected = select_columns(dataset, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = build_export_query(dataset, request.query_params, since, until)
+    
+    filename = f"{dataset}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream_export(db, dataset, query, selected, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @api_router.put("/admin/orders/{order_id}/status")
 async def update_order_status(
     order_id: str,
     status: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Update order status"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     result = await db.orders.update_one(
         {"id": order_id},
         {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}}
@@ -3723,26 +4104,16 @@ async def update_order_status(
     return {"message": "Order status updated"}
 
 @api_router.get("/shop/stats")
-async def get_shop_stats(current_user: dict = Depends(get_current_user)):
+async def get_shop_stats(current_user: dict = Depends(require_role("admin"))):
     """Get shop statistics"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
-    total_products = await db.products.count_documents({})
-    active_products = await db.products.count_documents({"is_active": True})
-    total_orders = await db.orders.count_documents({})
-    pending_orders = await db.orders.count_documents({"status": "En attente"})
-    
-    # Low stock products
-    low_stock = await db.products.find({"stock": {"$lt": 5}, "is_active": True}, {"_id": 0}).to_list(10)
-    
-    return {
-        "total_products": total_products,
-        "active_products": active_products,
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "low_stock_products": low_stock
-    }
+    return await run_queries({
+        "total_products": lambda: db.products.count_documents({}),
+        "active_products": lambda: db.products.count_documents({"is_active": True}),
+        "total_orders": lambda: db.orders.count_documents({}),
+        "pending_orders": lambda: db.orders.count_documents({"status": "En attente"}),
+        # Low stock products
+        "low_stock_products": lambda: db.products.find({"stock": {"$lt": 5}, "is_active": True}, {"_id": 0}).to_list(10),
+    })
 
 # ==================== STRIPE PAYMENT ENDPOINTS ====================
 
@@ -4015,6 +4386,7 @@ async def stripe_webhook(request: Request):
                             "license_paid_at": datetime.now(timezone.utc).isoformat()
                         }}
                     )
+                    invalidate_user_caches(user_id)
                     logger.info(f"Licence activated for user {user_id}")
                 
                 elif user_id and package_id == "premium":
@@ -4025,6 +4397,7 @@ async def stripe_webhook(request: Request):
                             "premium_since": datetime.now(timezone.utc).isoformat()
                         }}
                     )
+                    invalidate_user_caches(user_id)
                     logger.info(f"Premium activated for user {user_id}")
                 
                 # Update transaction
@@ -4084,6 +4457,7 @@ async def stripe_webhook(request: Request):
                     {"id": user_id},
                     {"$set": {"is_premium": False, "premium_cancelled_at": datetime.now(timezone.utc).isoformat()}}
                 )
+                invalidate_user_caches(user_id)
                 logger.info(f"Premium cancelled for user {user_id}")
         
         return {"status": "success", "event_type": event_type}
@@ -4327,11 +4701,8 @@ async def get_founder_message():
     }
 
 @api_router.get("/admin/site-content")
-async def get_site_content(current_user: dict = Depends(get_current_user)):
+async def get_site_content(current_user: dict = Depends(require_role("admin"))):
     """Admin: Get site content for editing"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     content = await db.settings.find_one({"id": "site_content"}, {"_id": 0})
     if not content:
         return DEFAULT_SITE_CONTENT
@@ -4341,11 +4712,8 @@ async def get_site_content(current_user: dict = Depends(get_current_user)):
     return merged
 
 @api_router.put("/admin/site-content")
-async def update_site_content(data: dict, current_user: dict = Depends(get_current_user)):
+async def update_site_content(data: dict, current_user: dict = Depends(require_role("admin"))):
     """Admin: Update site content"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     # Log pour debug
     import json
     data_size = len(json.dumps(data))
@@ -4374,11 +4742,8 @@ async def update_site_content(data: dict, current_user: dict = Depends(get_curre
     return {"message": "Contenu du site mis à jour"}
 
 @api_router.put("/admin/site-content/{section}")
-async def update_site_section(section: str, data: dict, current_user: dict = Depends(get_current_user)):
+async def update_site_section(section: str, data: dict, current_user: dict = Depends(require_role("admin"))):
     """Admin: Update a specific section of site content"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     valid_sections = ['hero', 'about', 'features', 'testimonials', 'contact', 'social_links', 'footer']
     if section not in valid_sections:
         raise HTTPException(status_code=400, detail=f"Section invalide. Sections valides: {', '.join(valid_sections)}")
@@ -4654,11 +5019,8 @@ async def get_chat_history(current_user: dict = Depends(get_current_user)):
 # ==================== AI CONFIGURATION ENDPOINTS ====================
 
 @api_router.get("/admin/ai-config")
-async def get_ai_configuration(current_user: dict = Depends(get_current_user)):
+async def get_ai_configuration(current_user: dict = Depends(require_role("admin"))):
     """Admin: Get AI assistant configuration"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     config = await db.settings.find_one({"id": "ai_config"}, {"_id": 0})
     if not config:
         return {
@@ -4674,11 +5036,8 @@ async def get_ai_configuration(current_user: dict = Depends(get_current_user)):
     return config
 
 @api_router.put("/admin/ai-config")
-async def update_ai_configuration(data: dict, current_user: dict = Depends(get_current_user)):
+async def update_ai_configuration(data: dict, current_user: dict = Depends(require_role("admin"))):
     """Admin: Update AI assistant configuration"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     allowed_fields = ["visitor_extra_instructions", "member_extra_instructions", "ai_enabled"]
     update_data = {k: v for k, v in data.items() if k in allowed_fields}
     update_data["id"] = "ai_config"
@@ -4699,11 +5058,8 @@ async def update_ai_configuration(data: dict, current_user: dict = Depends(get_c
 # ==================== MEMBERSHIP & INVOICE ENDPOINTS ====================
 
 @api_router.get("/admin/members/subscriptions")
-async def get_members_subscriptions(current_user: dict = Depends(get_current_user)):
+async def get_members_subscriptions(current_user: dict = Depends(require_role("admin"))):
     """Admin: Get all members with their subscription status"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     members = await db.users.find(
         {"role": "member"},
         {"_id": 0, "password_hash": 0}
@@ -4744,12 +5100,9 @@ async def update_member_subscription(
     user_id: str,
     has_paid_license: bool,
     license_paid_at: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Manually update a member's subscription status"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     update_data = {"has_paid_license": has_paid_license}
     if license_paid_at:
         update_data["license_paid_at"] = license_paid_at
@@ -4760,6 +5113,7 @@ async def update_member_subscription(
         {"id": user_id},
         {"$set": update_data}
     )
+    invalidate_user_caches(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Membre non trouvé")
@@ -4890,12 +5244,9 @@ async def generate_invoice_for_member(
     user_id: str,
     amount: float = 35.0,
     invoice_type: str = "membership",
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Generate an invoice for a member"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     user = await db.users.find_one({"id": user_id}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
@@ -4957,12 +5308,9 @@ async def create_pending_member(data: PendingMemberCreate):
 @api_router.get("/admin/pending-members")
 async def get_pending_members(
     status: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Get all pending member requests"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     query = {}
     if status:
         query["status"] = status
@@ -4976,11 +5324,8 @@ async def get_pending_members(
     return {"pending_members": pending, "total": len(pending)}
 
 @api_router.post("/admin/pending-members/{pending_id}/approve")
-async def approve_pending_member(pending_id: str, current_user: dict = Depends(get_current_user)):
+async def approve_pending_member(pending_id: str, current_user: dict = Depends(require_role("admin"))):
     """Admin: Approve a pending member and create their account"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     pending = await db.pending_members.find_one({"id": pending_id}, {"_id": 0})
     if not pending:
         raise HTTPException(status_code=404, detail="Demande non trouvée")
@@ -4996,7 +5341,7 @@ async def approve_pending_member(pending_id: str, current_user: dict = Depends(g
     # Create user account
     user = User(
         email=pending['email'],
-        password_hash=hash_password(temp_password),
+        password_hash=await hash_password(temp_password),
         full_name=pending['full_name'],
         role="membre",  # Rôle unifié français
         has_paid_license=True,  # Existing members already paid
@@ -5015,6 +5360,7 @@ async def approve_pending_member(pending_id: str, current_user: dict = Depends(g
     user_doc['training_mode'] = pending.get('training_mode', '')
     
     await db.users.insert_one(user_doc)
+    invalidate_user_caches(user_doc['id'])
     
     # Update pending member status
     await db.pending_members.update_one(
@@ -5054,12 +5400,9 @@ async def approve_pending_member(pending_id: str, current_user: dict = Depends(g
 async def reject_pending_member(
     pending_id: str,
     reason: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Admin: Reject a pending member request"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     pending = await db.pending_members.find_one({"id": pending_id}, {"_id": 0})
     if not pending:
         raise HTTPException(status_code=404, detail="Demande non trouvée")
@@ -5094,11 +5437,8 @@ async def reject_pending_member(
 # ==================== SMTP SETTINGS ENDPOINTS ====================
 
 @api_router.get("/admin/settings/smtp")
-async def get_smtp_settings(current_user: dict = Depends(get_current_user)):
+async def get_smtp_settings(current_user: dict = Depends(require_role("admin"))):
     """Admin: Get SMTP settings (password masked)"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     settings = await db.settings.find_one({"id": "smtp_settings"}, {"_id": 0})
     if not settings:
         # Return default settings
@@ -5117,11 +5457,8 @@ async def get_smtp_settings(current_user: dict = Depends(get_current_user)):
     return settings
 
 @api_router.put("/admin/settings/smtp")
-async def update_smtp_settings(data: SmtpSettingsUpdate, current_user: dict = Depends(get_current_user)):
+async def update_smtp_settings(data: SmtpSettingsUpdate, current_user: dict = Depends(require_role("admin"))):
     """Admin: Update SMTP settings"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
     update_data['id'] = "smtp_settings"
@@ -5143,11 +5480,8 @@ async def update_smtp_settings(data: SmtpSettingsUpdate, current_user: dict = De
     return {"message": "Paramètres SMTP mis à jour avec succès"}
 
 @api_router.post("/admin/settings/smtp/test")
-async def test_smtp_settings(data: SmtpTestRequest, current_user: dict = Depends(get_current_user)):
+async def test_smtp_settings(data: SmtpTestRequest, current_user: dict = Depends(require_role("admin"))):
     """Admin: Send test email to verify SMTP settings"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     # Get SMTP settings from database
     settings = await db.settings.find_one({"id": "smtp_settings"})
     if not settings:
@@ -5303,11 +5637,8 @@ async def get_club(club_id: str):
     return club
 
 @api_router.post("/admin/clubs")
-async def create_club(club_data: ClubCreate, current_user: dict = Depends(get_current_user)):
+async def create_club(club_data: ClubCreate, current_user: dict = Depends(require_role("admin", detail="Accès réservé aux administrateurs"))):
     """Create a new club (admin only)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
-    
     # Verify technical director exists
     dt = await db.users.find_one({"id": club_data.technical_director_id}, {"_id": 0})
     if not dt:
@@ -5340,15 +5671,15 @@ async def create_club(club_data: ClubCreate, current_user: dict = Depends(get_cu
         {"id": club_data.technical_director_id},
         {"$set": {"club_id": club_id, "role": "technical_director" if dt.get("role") != "admin" else dt.get("role")}}
     )
+    invalidate_user_caches(club_data.technical_director_id)
+    if dt.get("role") not in ("admin", "technical_director"):
+        await revoke_user_tokens(club_data.technical_director_id)
     
     return {"message": "Club créé avec succès", "club": {k: v for k, v in club.items() if k != "_id"}}
 
 @api_router.put("/admin/clubs/{club_id}")
-async def update_club(club_id: str, club_data: ClubUpdate, current_user: dict = Depends(get_current_user)):
+async def update_club(club_id: str, club_data: ClubUpdate, current_user: dict = Depends(require_role("admin", detail="Accès réservé aux administrateurs"))):
     """Update a club (admin only)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
-    
     club = await db.clubs.find_one({"id": club_id})
     if not club:
         raise HTTPException(status_code=404, detail="Club non trouvé")
@@ -5367,6 +5698,7 @@ async def update_club(club_id: str, club_data: ClubUpdate, current_user: dict =
             {"id": update_data["technical_director_id"]},
             {"$set": {"club_id": club_id}}
         )
+        invalidate_user_caches(update_data["technical_director_id"])
     
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
@@ -5376,11 +5708,8 @@ async def update_club(club_id: str, club_data: ClubUpdate, current_user: dict =
     return {"message": "Club mis à jour", "club": updated_club}
 
 @api_router.delete("/admin/clubs/{club_id}")
-async def delete_club(club_id: str, current_user: dict = Depends(get_current_user)):
+async def delete_club(club_id: str, current_user: dict = Depends(require_role("admin", detail="Accès réservé aux administrateurs"))):
     """Delete a club (admin only)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
-    
     club = await db.clubs.find_one({"id": club_id})
     if not club:
         raise HTTPException(status_code=404, detail="Club non trouvé")
@@ -5396,11 +5725,8 @@ async def delete_club(club_id: str, current_user: dict = Depends(get_current_use
     return {"message": "Club supprimé avec succès"}
 
 @api_router.post("/admin/clubs/{club_id}/members/{user_id}")
-async def assign_member_to_club(club_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
+async def assign_member_to_club(club_id: str, user_id: str, current_user: dict = Depends(require_role("admin", detail="Accès réservé aux administrateurs"))):
     """Assign a member to a club (admin only)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
-    
     club = await db.clubs.find_one({"id": club_id})
     if not club:
         raise HTTPException(status_code=404, detail="Club non trouvé")
@@ -5410,27 +5736,34 @@ async def assign_member_to_club(club_id: str, user_id: str, current_user: dict =
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
     await db.users.update_one({"id": user_id}, {"$set": {"club_id": club_id}})
+    invalidate_user_caches(user_id)
     
     return {"message": f"Membre assigné au club {club['name']}"}
 
 @api_router.delete("/admin/clubs/{club_id}/members/{user_id}")
-async def remove_member_from_club(club_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
+async def remove_member_from_club(club_id: str, user_id: str, current_user: dict = Depends(require_role("admin", detail="Accès réservé aux administrateurs"))):
     """Remove a member from a club (admin only)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
-    
     await db.users.update_one({"id": user_id}, {"$unset": {"club_id": ""}})
+    invalidate_user_caches(user_id)
     
     return {"message": "Membre retiré du club"}
 
 @api_router.get("/clubs/{club_id}/stats")
 async def get_club_stats(club_id: str, current_user: dict = Depends(get_current_user)):
     """Get statistics for a club"""
-    club = await db.clubs.find_one({"id": club_id}, {"_id": 0})
-    if not club:
+    results = await run_queries({
+        "club": lambda: db.clubs.find_one({"id": club_id}, {"_id": 0, "id": 1}),
+        "members": lambda: db.users.find(
+            {"club_id": club_id},
+            {"_id": 0, "belt_grade": 1, "role": 1, "has_paid_license": 1, "is_premium": 1}
+        ).to_list(1000),
+        "pending_visits": lambda: db.visit_requests.count_documents({"target_club_id": club_id, "status": "En attente"}),
+        "approved_visits": lambda: db.visit_requests.count_documents({"target_club_id": club_id, "status": "Approuvé"}),
+    })
+    if not results["club"]:
         raise HTTPException(status_code=404, detail="Club non trouvé")
     
-    members = await db.users.find({"club_id": club_id}, {"_id": 0}).to_list(1000)
+    members = results["members"]
     
     # Calculate statistics
     stats = {
@@ -5439,8 +5772,8 @@ async def get_club_stats(club_id: str, current_user: dict = Depends(get_current_
         "by_role": {},
         "with_license": 0,
         "premium_members": 0,
-        "pending_visits": await db.visit_requests.count_documents({"target_club_id": club_id, "status": "En attente"}),
-        "approved_visits": await db.visit_requests.count_documents({"target_club_id": club_id, "status": "Approuvé"})
+        "pending_visits": results["pending_visits"],
+        "approved_visits": results["approved_visits"]
     }
     
     for member in members:
@@ -6127,7 +6460,7 @@ async def get_token_leaderboard(
                 "rank": higher_count + 1,
                 "user_id": current_user.get("id"),
                 "user_name": current_user.get("full_name"),
-                "user_photo": current_user.get("photo_url"),
+                "user_photo": await get_user_photo(current_user.get("id")),
                 "balance": user_balance.get("balance", 0),
                 "total_earned": user_balance.get("total_earned", 0),
                 "level": user_balance.get("level", 1),
@@ -6170,12 +6503,9 @@ async def redeem_tokens(
 @api_router.post("/admin/tokens/grant")
 async def admin_grant_tokens(
     request: TokenGrantRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin", "fondateur", detail="Admin uniquement"))
 ):
     """Attribution de tokens par un admin"""
-    if current_user.get("role") not in ["admin", "fondateur"]:
-        raise HTTPException(status_code=403, detail="Admin uniquement")
-    
     # Vérifier que l'utilisateur cible existe
     target_user = await db.users.find_one({"id": request.user_id})
     if not target_user:
@@ -6197,11 +6527,8 @@ async def admin_grant_tokens(
     }
 
 @api_router.get("/admin/tokens/stats")
-async def admin_token_stats(current_user: dict = Depends(get_current_user)):
+async def admin_token_stats(current_user: dict = Depends(require_role("admin", "fondateur", detail="Admin uniquement"))):
     """Statistiques globales des tokens (admin)"""
-    if current_user.get("role") not in ["admin", "fondateur"]:
-        raise HTTPException(status_code=403, detail="Admin uniquement")
-    
     # Stats globales
     pipeline = [
         {"$group": {
@@ -6288,6 +6615,16 @@ async def get_my_badges(current_user: dict = Depends(get_current_user)):
 
 # ========== SPONSORS/PUBLICITÉS ENDPOINTS ==========
 
+def record_sponsor_event(sponsor_id: str, field: str) -> None:
+    """Count an impression or a click on the sponsor and in its hourly bucket"""
+    hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    counter_buffer.incr("sponsors", sponsor_id, field)
+    counter_buffer.incr_bucket(
+        "sponsor_stats_hourly",
+        {"sponsor_id": sponsor_id, "hour": hour.isoformat(), "day": hour.date().isoformat()},
+        field
+    )
+
 @api_router.get("/sponsors")
 async def get_active_sponsors():
     """Récupère les sponsors actifs pour affichage public"""
@@ -6302,12 +6639,9 @@ async def get_active_sponsors():
         ]
     }, {"_id": 0}).sort("priority", -1).to_list(100)
     
-    # Incrémenter les impressions
+    # Incrémenter les impressions (écriture groupée en tâche de fond)
     for sponsor in sponsors:
-        await db.sponsors.update_one(
-            {"id": sponsor["id"]},
-            {"$inc": {"impressions": 1}}
-        )
+        record_sponsor_event(sponsor["id"], "impressions")
     
     return {"sponsors": sponsors}
 
@@ -6320,31 +6654,22 @@ async def track_sponsor_click(sponsor_id: str):
         raise HTTPException(status_code=404, detail="Sponsor introuvable")
     
     # Incrémenter les clics
-    await db.sponsors.update_one(
-        {"id": sponsor_id},
-        {"$inc": {"clicks": 1}}
-    )
+    record_sponsor_event(sponsor_id, "clicks")
     
     return {"success": True, "redirect_url": sponsor.get("website_url")}
 
 @api_router.get("/admin/sponsors")
-async def get_all_sponsors_admin(current_user: dict = Depends(get_current_user)):
+async def get_all_sponsors_admin(current_user: dict = Depends(require_role("admin"))):
     """Liste tous les sponsors (admin)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     sponsors = await db.sponsors.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
     return {"sponsors": sponsors}
 
 @api_router.post("/admin/sponsors")
 async def create_sponsor(
     sponsor_data: SponsorCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Créer un nouveau sponsor (admin)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     sponsor = Sponsor(**sponsor_data.model_dump())
     sponsor_dict = sponsor.model_dump()
     sponsor_dict["created_at"] = sponsor_dict["created_at"].isoformat()
@@ -6372,12 +6697,9 @@ async def create_sponsor(
 async def update_sponsor(
     sponsor_id: str,
     sponsor_data: SponsorUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Mettre à jour un sponsor (admin)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     existing = await db.sponsors.find_one({"id": sponsor_id})
     if not existing:
         raise HTTPException(status_code=404, detail="Sponsor introuvable")
@@ -6409,12 +6731,9 @@ async def update_sponsor(
 @api_router.delete("/admin/sponsors/{sponsor_id}")
 async def delete_sponsor(
     sponsor_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_role("admin"))
 ):
     """Supprimer un sponsor (admin)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
     result = await db.sponsors.delete_one({"id": sponsor_id})
     
     if result.deleted_count == 0:
@@ -6423,37 +6742,83 @@ async def delete_sponsor(
     return {"success": True}
 
 @api_router.get("/admin/sponsors/stats")
-async def get_sponsors_stats(current_user: dict = Depends(get_current_user)):
-    """Statistiques globales des sponsors (admin)"""
-    if current_user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
-    sponsors = await db.sponsors.find({}, {"_id": 0}).to_list(100)
+async def get_sponsors_stats(
+    days: int = 30,
+    sponsor_id: Optional[str] = None,
+    current_user: dict = Depends(require_role("admin"))
+):
+    """Statistiques globales des sponsors (admin), avec série quotidienne du CTR"""
+    days = max(1, min(days, 365))
+    since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).date().isoformat()
+    bucket_match = {"day": {"$gte": since}}
+    if sponsor_id:
+        bucket_match["sponsor_id"] = sponsor_id
+    
+    total_sponsors, active_sponsors, totals, top_performers, daily = await asyncio.gather(
+        db.sponsors.count_documents({}),
+        db.sponsors.count_documents({"active": True}),
+        db.sponsors.aggregate([
+            {"$group": {
+                "_id": None,
+                "impressions": {"$sum": {"$ifNull": ["$impressions", 0]}},
+                "clicks": {"$sum": {"$ifNull": ["$clicks", 0]}}
+            }}
+        ]).to_list(1),
+        db.sponsors.find({}, {"_id": 0}).sort("clicks", -1).limit(5).to_list(5),
+        # Série quotidienne à partir des compteurs horaires
+        db.sponsor_stats_hourly.aggregate([
+            {"$match": bucket_match},
+            {"$group": {
+                "_id": "$day",
+                "impressions": {"$sum": "$impressions"},
+                "clicks": {"$sum": "$clicks"}
+            }},
+            {"$sort": {"_id": 1}}
+        ]).to_list(None)
+    )
     
-    total_impressions = sum(s.get("impressions", 0) for s in sponsors)
-    total_clicks = sum(s.get("clicks", 0) for s in sponsors)
+    total_impressions = totals[0]["impressions"] if totals else 0
+    total_clicks = totals[0]["clicks"] if totals else 0
     
     # Calcul du CTR (Click-Through Rate)
     ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
     
-    # Sponsors par performance
-    sponsors_by_performance = sorted(
-        sponsors,
-        key=lambda s: s.get("clicks", 0),
-        reverse=True
-    )
-    
     return {
-        "total_sponsors": len(sponsors),
-        "active_sponsors": len([s for s in sponsors if s.get("active")]),
+        "total_sponsors": total_sponsors,
+        "active_sponsors": active_sponsors,
         "total_impressions": total_impressions,
         "total_clicks": total_clicks,
         "ctr_percentage": round(ctr, 2),
-        "top_performers": sponsors_by_performance[:5]
+        "top_performers": top_performers,
+        "daily": [
+            {
+                "date": day["_id"],
+                "impressions": day.get("impressions") or 0,
+                "clicks": day.get("clicks") or 0,
+                "ctr_percentage": round(day["clicks"] / day["impressions"] * 100, 2) if day.get("impressions") and day.get("clicks") else 0
+            }
+            for day in daily
+        ]
     }
 
 # ========== FIN SPONSORS ENDPOINTS ==========
 
+# ==================== RUNTIME METRICS ====================
+
+@api_router.get("/admin/metrics")
+async def get_runtime_metrics(current_user: dict = Depends(require_role("admin"))):
+    """Admin: in-process metrics of this worker (queues, caches)"""
+    return {
+        "password_hashing": password_hasher.stats(),
+        "principal_cache": {"entries": len(principal_cache)},
+        "person_cache": {"entries": len(person_resolver)},
+        "people_index": {"entries": len(people_index), "ready": people_index.ready},
+        "presence": presence_tracker.stats(),
+        "events": event_hub.stats(),
+        "message_digest": message_digest.stats(),
+        "counters": counter_buffer.stats(),
+    }
+
 app.include_router(api_router)
 
 app.add_middleware(GZipMiddleware, minimum_size=1000)
@@ -6464,6 +6829,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Before-Cursor", "X-After-Cursor"],
 )
 
 logging.basicConfig(
@@ -6528,17 +6894,87 @@ else:
             "mode": "api-only"
         }
 
+# ============================================================================
+# BACKGROUND JOBS
+# ============================================================================
+
+POST_COUNTERS_RECONCILE_INTERVAL_SECONDS = float(os.environ.get('POST_COUNTERS_RECONCILE_INTERVAL_SECONDS', '3600'))
+FORUM_COUNTERS_RECONCILE_INTERVAL_SECONDS = float(os.environ.get('FORUM_COUNTERS_RECONCILE_INTERVAL_SECONDS', '3600'))
+
+background_tasks: List[asyncio.Task] = []
+
+async def run_periodically(name: str, interval_seconds: float, job):
+    """Run `job` every `interval_seconds` until cancelled, logging failures"""
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Tâche de fond {name}: {e}")
+        await asyncio.sleep(interval_seconds)
+
+def start_background_job(name: str, interval_seconds: float, job) -> None:
+    background_tasks.append(asyncio.create_task(run_periodically(name, interval_seconds, job)))
+
 @app.on_event("startup")
 async def startup_db_client():
-    """Test MongoDB connection on startup"""
+    """Test MongoDB connection, bootstrap indexes and start background jobs"""
     try:
         # Test the connection
         await client.admin.command('ping')
         logger.info("✅ MongoDB connecté avec succès")
+
+        # Créer les index manquants (idempotent, voir db_indexes.py)
+        try:
+            await ensure_indexes(db)
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la création des index: {e}")
     except Exception as e:
         logger.error(f"❌ ERREUR MongoDB: {e}")
         logger.error("Vérifiez votre MONGO_URL dans backend/.env")
 
+    start_background_job("post_counters", POST_COUNTERS_RECONCILE_INTERVAL_SECONDS,
+                         lambda: reconcile_post_counters(db))
+    start_background_job("dashboard_stats", DASHBOARD_STATS_REFRESH_INTERVAL_SECONDS,
+                         lambda: refresh_dashboard_snapshot(db))
+    start_background_job("forum_counters", FORUM_COUNTERS_RECONCILE_INTERVAL_SECONDS,
+                         lambda: reconcile_forum_counters(db))
+    start_background_job("counters", COUNTER_FLUSH_INTERVAL_SECONDS,
+                         lambda: counter_buffer.flush(db))
+    start_background_job("presence", PRESENCE_FLUSH_INTERVAL_SECONDS,
+                         lambda: presence_tracker.flush(db))
+    # Construit l'index au démarrage, puis le reconstruit pour les écritures hors API
+    start_background_job("people_index", PEOPLE_INDEX_REBUILD_INTERVAL_SECONDS,
+                         lambda: people_index.build(db))
+    start_background_job("message_digest", min(MESSAGE_DIGEST_WINDOW_SECONDS, 60),
+                         lambda: message_digest.flush(db))
+
+    if EVENT_RELAY_ENABLED:
+        relay = MongoEventRelay(db, event_hub)
+        try:
+            await relay.setup()
+            # run() ne rend la main qu'en cas d'erreur: relancé après 5 s
+            start_background_job("event_relay", 5, relay.run)
+        except Exception as e:
+            logger.error(f"❌ Relais d'événements indisponible: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    try:
+        await presence_tracker.flush(db)
+    except Exception as e:
+        logger.error(f"❌ Flush de la présence à l'arrêt: {e}")
+    try:
+        await counter_buffer.flush(db)
+    except Exception as e:
+        logger.error(f"❌ Écriture des compteurs à l'arrêt: {e}")
+    try:
+        await message_digest.flush(db, force=True)
+    except Exception as e:
+        logger.error(f"❌ Envoi des notifications en attente à l'arrêt: {e}")
+    password_hasher.shutdown()
     client.close()
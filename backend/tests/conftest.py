@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Les modules du backend sont importés à plat (comme depuis server.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,62 @@
+import asyncio
+
+from pymongo.errors import OperationFailure
+
+from content_search import search_content
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, n):
+        return self
+
+    async def to_list(self, n):
+        return [dict(doc) for doc in self.docs]
+
+
+class FakeCollection:
+    def __init__(self, docs=(), error=None):
+        self.docs, self.error = list(docs), error
+
+    def find(self, query, projection):
+        if self.error:
+            raise self.error
+        return FakeCursor(self.docs)
+
+    async def count_documents(self, query):
+        if self.error:
+            raise self.error
+        return len(self.docs)
+
+
+def _search(db, types):
+    return asyncio.run(search_content(db, "judo", {t: {} for t in types}))
+
+
+def test_scores_share_one_scale_across_types():
+    db = {
+        # Titre exact (poids 10) contre un mot isolé dans un message (poids 1)
+        "news": FakeCollection([{"id": "n1", "title": "Judo", "score": 11.0}]),
+        "forum_messages": FakeCollection([{"id": "m1", "content": "un peu de judo", "score": 0.55}]),
+    }
+    result = _search(db, ["news", "forum_message"])
+
+    assert [r["id"] for r in result["results"]] == ["n1", "m1"]
+    assert result["results"][0]["score"] == 1.0
+    assert result["results"][1]["score"] == 0.05
+
+
+def test_failing_type_is_returned_empty():
+    db = {
+        "news": FakeCollection([{"id": "n1", "title": "Judo", "score": 11.0}]),
+        "events": FakeCollection(error=OperationFailure("text index required for $text query", 27)),
+    }
+    result = _search(db, ["news", "event"])
+
+    assert [r["id"] for r in result["results"]] == ["n1"]
+    assert result["facets"] == {"news": 1, "event": 0}
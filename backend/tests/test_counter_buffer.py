@@ -0,0 +1,56 @@
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from counter_buffer import CounterBuffer
+
+
+class FakeCollection:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls.append(operations)
+        if self.error:
+            raise self.error
+
+
+def _buffer():
+    buffer = CounterBuffer()
+    buffer.incr("news", "a", "views")
+    buffer.incr("news", "b", "views", 2)
+    buffer.incr("news", "c", "views", 3)
+    return buffer
+
+
+def test_flush_writes_every_document():
+    buffer, collection = _buffer(), FakeCollection()
+    assert asyncio.run(buffer.flush({"news": collection})) == 3
+    assert len(collection.calls[0]) == 3
+    assert buffer.stats()["pending_counters"] == 0
+
+
+def test_partial_failure_requeues_only_failed_operations():
+    error = BulkWriteError({
+        "writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000"}],
+        "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+        "nMatched": 2, "nModified": 2, "nRemoved": 0, "upserted": [],
+    })
+    buffer = _buffer()
+    written = asyncio.run(buffer.flush({"news": FakeCollection(error)}))
+
+    assert written == 2
+    # Seul "b" (index 1) reste en attente: "a" et "c" ne sont pas comptés deux fois
+    assert buffer.pending("news", "a", "views") == 0
+    assert buffer.pending("news", "b", "views") == 2
+    assert buffer.pending("news", "c", "views") == 0
+    assert buffer.stats()["pending_counters"] == 1
+
+
+def test_unknown_failure_requeues_everything():
+    buffer = _buffer()
+    written = asyncio.run(buffer.flush({"news": FakeCollection(ConnectionError("down"))}))
+
+    assert written == 0
+    assert [buffer.pending("news", doc_id, "views") for doc_id in "abc"] == [1, 2, 3]
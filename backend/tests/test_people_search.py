@@ -0,0 +1,55 @@
+import pytest
+
+from people_search import PeopleSearchIndex
+
+
+@pytest.fixture
+def index():
+    index = PeopleSearchIndex()
+    index.add({"id": "jd", "name": "Jean Dupont", "email": "jean.dupont@orange.fr", "type": "Admin"})
+    index.add({"id": "ml", "name": "Marie Lefèvre", "email": "marie@skynet.be", "type": "Membre"})
+    index.add({"id": "hz", "name": "Hans Zimmer", "email": "hz@bluewin.ch", "type": "Membre"})
+    index.add({"id": "ab", "name": "Anne Bernard", "email": "jd@x.com", "type": "Membre"})
+    return index
+
+
+def ids(results):
+    return [card["id"] for card in results]
+
+
+def test_name_prefix_and_accents(index):
+    assert ids(index.search("lefev")) == ["ml"]
+    assert ids(index.search("jean dup")) == ["jd"]
+
+
+def test_full_email(index):
+    assert ids(index.search("jean.dupont@orange.fr")) == ["jd"]
+    assert ids(index.search("Jean.Dupont@Orange.FR")) == ["jd"]
+
+
+def test_partial_email(index):
+    assert ids(index.search("jean.dupont@orange.f")) == ["jd"]
+    assert ids(index.search("t@orange")) == ["jd"]
+    assert ids(index.search("jd@x")) == ["ab"]
+
+
+def test_domain(index):
+    assert ids(index.search("orange.fr")) == ["jd"]
+    assert ids(index.search("skynet")) == ["ml"]
+
+
+@pytest.mark.parametrize("label, expected", [(".fr", "jd"), (".be", "ml"), (".ch", "hz")])
+def test_two_letter_domain_labels(index, label, expected):
+    assert expected in ids(index.search(label))
+    assert ids(index.search(f"{index._cards[expected]['name'].split()[0]} {label}")) == [expected]
+
+
+def test_removed_person_is_not_found(index):
+    index.remove("jd")
+    assert index.search("jean.dupont@orange.fr") == []
+    assert index.search("orange") == []
+
+
+def test_system_addresses_are_not_indexed(index):
+    index.add({"id": "sys", "name": "Académie", "email": "contact@academie-levinet.com", "type": "Admin"})
+    assert "sys" not in ids(index.search("contact"))
@@ -0,0 +1,91 @@
+"""Compteurs de messages non lus, maintenus à l'écriture.
+
+Un document par utilisateur dans `unread_counters`:
+    {"user_id": ..., "total": 3, "conversations": {"<conversation_id>": 3}}
+
+send_message incrémente le compteur des destinataires, la lecture d'une
+conversation le remet à zéro (ou au nombre de messages encore non lus après
+le repère de lecture). Le badge de la barre de navigation ne lit plus
+qu'un document. Un compteur absent est initialisé depuis `messages` au
+premier appel.
+"""
+from typing import Iterable, Optional
+
+
+async def increment_unread(db, user_ids: Iterable[str], conversation_id: str) -> None:
+    """Count one new message for each recipient that already has a counter"""
+    for user_id in user_ids:
+        await db.unread_counters.update_one(
+            {"user_id": user_id},
+            {"$inc": {"total": 1, f"conversations.{conversation_id}": 1}}
+        )
+
+
+async def decrement_unread(db, user_ids: Iterable[str], conversation_id: str) -> None:
+    """Uncount one unread message (e.g. deleted before being read), never below 0"""
+    conversation_field = f"conversations.{conversation_id}"
+    for user_id in user_ids:
+        await db.unread_counters.update_one(
+            {"user_id": user_id, conversation_field: {"$gt": 0}},
+            {"$inc": {"total": -1, conversation_field: -1}}
+        )
+
+
+async def reset_unread(db, user_id: str, conversation_id: str, remaining: int = 0) -> None:
+    """Set a conversation's unread count (0 = fully read) in one atomic pipeline update"""
+    conversation_field = f"conversations.{conversation_id}"
+    await db.unread_counters.update_one(
+        {"user_id": user_id},
+        [{"$set": {
+            "total": {"$max": [0, {"$add": [
+                {"$subtract": ["$total", {"$ifNull": [f"${conversation_field}", 0]}]},
+                remaining
+            ]}]},
+            conversation_field: remaining
+        }}]
+    )
+
+
+async def get_conversation_unread(db, user_id: str, conversation_id: str) -> Optional[int]:
+    """Unread count of one conversation, or None when the user has no counter yet"""
+    counter = await db.unread_counters.find_one(
+        {"user_id": user_id},
+        {"_id": 0, f"conversations.{conversation_id}": 1}
+    )
+    if counter is None:
+        return None
+    return max((counter.get("conversations") or {}).get(conversation_id, 0), 0)
+
+
+async def get_unread_total(db, user_id: str) -> int:
+    counter = await db.unread_counters.find_one({"user_id": user_id}, {"_id": 0, "total": 1})
+    if counter is None:
+        counter = await _initialize_counter(db, user_id)
+    return max(counter.get("total", 0), 0)
+
+
+async def _initialize_counter(db, user_id: str) -> dict:
+    """Build a user's counter from the messages still flagged as unread"""
+    conversation_ids = [
+        conv["id"] async for conv in db.conversations.find({"participants": user_id}, {"_id": 0, "id": 1})
+    ]
+    groups = await db.messages.aggregate([
+        {"$match": {
+            "conversation_id": {"$in": conversation_ids},
+            "read": False,
+            "sender_id": {"$ne": user_id}
+        }},
+        {"$group": {"_id": "$conversation_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+
+    counter = {
+        "total": sum(group["count"] for group in groups),
+        "conversations": {group["_id"]: group["count"] for group in groups},
+    }
+    # $setOnInsert: ne pas écraser un compteur créé entre-temps par un autre worker
+    await db.unread_counters.update_one(
+        {"user_id": user_id},
+        {"$setOnInsert": counter},
+        upsert=True
+    )
+    return counter